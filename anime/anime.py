@@ -1,20 +1,96 @@
+import asyncio
+import datetime
 import logging
+import multiprocessing
+import site
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-import aiohttp
 import discord
-from redbot.core import commands
+from redbot.core import Config, commands
 from redbot.core.commands import Context
+from redbot.core.data_manager import cog_data_path
 from redbot.vendored.discord.ext import menus
 
-from .utility import (AniListMediaType, AniListSearchType, AnimeThemesClient,
-                      EmbedListMenu, is_adult)
-from .utils.anilist import AniListClient
+from .utility import (TRACEMOE_BASE_URL, AniListMediaType, AniListSearchType,
+                      EmbedListMenu, LazyEmbedMenu, StreamedPageSource,
+                      get_media_title, get_season, is_adult,
+                      parse_media_filters)
+from .utils.anilist import USER_FAVOURITES_SECTIONS, AniListClient
 from .utils.animenewsnetwork import AnimeNewsNetworkClient
+from .utils.animethemes import THEMES_FIELDS, AnimeThemesClient, normalize_slug
+from .utils.archive import NewsArchive
+from .utils.cache import TTLCache
+from .utils.catalog import AniListCatalog
+from .utils.chart import CoverCache, chart_key, render_chart
+from .utils.countdown import CountdownTicker
 from .utils.crunchyroll import CrunchyrollClient
-from .utils.finder import Finder
+from .utils.feeds import FEED_POLL_INTERVAL
+from .utils.finder import FUZZY_SIMILARITY, Finder
+from .utils.limiter import FairLimiter, current_guild
+from .utils.lists import GENRES, ListStore, list_statistics
+from .utils.mentions import MentionThrottle, find_mentions
+from .utils.news import NEWS_FEEDS, NEWS_PUSH_LIMIT, SeenItems, merge_news
+from .utils.prefix import PrefixIndex
+from .utils.relations import RelationGraph
+from .utils.similar import SimilarityIndex
+from .utils.slash import (InteractionContext, InteractionType, register_commands,
+                          slash_command, unregister_commands)
+from .utils.themes import AnimeThemesMirror
+from .utils.tracemoe import TraceMoeClient, TraceMoeImageTooLarge
+from .utils.transport import HTTPTransport
+from .utils.trigram import TrigramIndex, normalize_title
 
 log = logging.getLogger("red.historian.anime")
 
+SEASON_CACHE_TTL = 60 * 60
+
+CATALOG_SYNC_INTERVAL = 12 * 60 * 60
+
+THEMES_SYNC_INTERVAL = 24 * 60 * 60
+
+USER_CACHE_TTL = 10 * 60
+
+MENTION_CACHE_TTL = 30 * 60
+
+THEME_MEDIA_CACHE_TTL = 6 * 60 * 60
+
+# AniList anime without AnimeThemes entry are looked up again after a day.
+UNMAPPED_CACHE_TTL = 24 * 60 * 60
+
+BROWSE_PER_PAGE = 10
+
+BROWSE_SORTS = {
+    "popular": "POPULARITY_DESC",
+    "score": "SCORE_DESC",
+    "trending": "TRENDING_DESC",
+    "newest": "START_DATE_DESC",
+    "oldest": "START_DATE",
+}
+
+# Favourites change far less often than the statistics, studios least of all.
+FAVOURITES_CACHE_TTLS = {
+    "anime": 60 * 60,
+    "manga": 60 * 60,
+    "characters": 3 * 60 * 60,
+    "staff": 6 * 60 * 60,
+    "studios": 12 * 60 * 60,
+}
+
+SLASH_COMMANDS = {
+    "anime": (AniListSearchType.Anime, "ANIME"),
+    "manga": (AniListSearchType.Manga, "MANGA"),
+    "character": (AniListSearchType.Character, "CHARACTER"),
+}
+
+SLASH_COMMAND_PAYLOADS = [
+    slash_command("anime", "Searches for an anime.", "title", "The anime title."),
+    slash_command("manga", "Searches for a manga.", "title", "The manga title."),
+    slash_command("character", "Searches for a character.", "title", "The character name."),
+]
+
 
 class Anime(Finder, commands.Cog):
     """Search for anime, manga, characters and users using Anilist"""
@@ -29,29 +105,476 @@ class Anime(Finder, commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = aiohttp.ClientSession()
-        self.anilist = AniListClient(session=self.session)
+        self.transport = HTTPTransport()
+        self.limiter = FairLimiter()
+        self.anilist = AniListClient(limiter=self.limiter, transport=self.transport)
         self.animethemes = AnimeThemesClient(
-            session=self.session, headers={"User-Agent": "Some Discord Bot"}
+            headers={"User-Agent": "Some Discord Bot"},
+            limiter=self.limiter,
+            transport=self.transport,
         )
-        self.animenewsnetwork = AnimeNewsNetworkClient(session=self.session)
-        self.crunchyroll = CrunchyrollClient(session=self.session)
+        self.animenewsnetwork = AnimeNewsNetworkClient(
+            limiter=self.limiter, transport=self.transport
+        )
+        self.crunchyroll = CrunchyrollClient(limiter=self.limiter, transport=self.transport)
+        self.tracemoe = TraceMoeClient(limiter=self.limiter, transport=self.transport)
+        self.covers = CoverCache(cog_data_path(self) / "covers")
+        self._season_cache: Dict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._users = TTLCache(USER_CACHE_TTL, maxsize=256)
+        self._favourites = {
+            section: TTLCache(ttl, maxsize=256) for section, ttl in FAVOURITES_CACHE_TTLS.items()
+        }
+        self.config = Config.get_conf(self, identifier=2420_0666, force_registration=True)
+        self.config.register_global(
+            catalog=False,
+            slash_commands={},
+            tracemoe_url=TRACEMOE_BASE_URL,
+            themes_mirror=False,
+            news_seen={},
+        )
+        self.config.register_guild(mentions=False)
+        self.config.register_channel(news=[])
+        self.config.register_user(anilist_id=None, anilist_name=None)
+        # The AnimeThemes slug of each AniList anime resolved by its ids.
+        self.config.init_custom("ANIMETHEMES", 1)
+        self.config.register_custom("ANIMETHEMES", slug=None)
+        self._unmapped = TTLCache(UNMAPPED_CACHE_TTL, maxsize=1024)
+        self._theme_media = TTLCache(THEME_MEDIA_CACHE_TTL, maxsize=512)
+        self._mention_cards = TTLCache(MENTION_CACHE_TTL, maxsize=512)
+        self._mention_throttle = MentionThrottle()
+        self.countdowns = CountdownTicker()
+        self.lists = ListStore(cog_data_path(self) / "lists")
+        self.catalog: Optional[AniListCatalog] = None
+        self.titles = TrigramIndex()
+        self.suggestions = PrefixIndex()
+        self.relations = RelationGraph(self.anilist)
+        self.similar = SimilarityIndex()
+        self._catalog_task: Optional[asyncio.Task] = None
+        self.themes_mirror: Optional[AnimeThemesMirror] = None
+        self._themes_mirror_task: Optional[asyncio.Task] = None
+        self._news_clients = {"ann": self.animenewsnetwork, "crunchyroll": self.crunchyroll}
+        self._news_seen: Dict[str, SeenItems] = {}
+        self.news_archive = NewsArchive(cog_data_path(self) / "news.jsonl")
+        self._feed_tasks: List[asyncio.Task] = []
+        self._init_task = self.bot.loop.create_task(self._initialize())
 
     def cog_unload(self):
-        self.bot.loop.create_task(self.session.close())
+        self._init_task.cancel()
+        for task in self._feed_tasks:
+            task.cancel()
+        self._stop_catalog()
+        self._stop_themes_mirror()
+        self.countdowns.stop()
+        self.bot.loop.create_task(self.transport.close())
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+
+    async def cog_before_invoke(self, ctx: Context):
+        # Outbound API calls of the command are queued under its guild by the shared limiter.
+        current_guild.set(ctx.guild.id if ctx.guild else None)
+
+    async def red_delete_data_for_user(self, *, requester, user_id: int):
+        anilist_id = await self.config.user_from_id(user_id).anilist_id()
+        if anilist_id is not None:
+            self.lists.remove(anilist_id)
+        await self.config.user_from_id(user_id).clear()
+
+    async def _initialize(self) -> None:
+        """Starts the background services enabled in the config."""
+        self.tracemoe.set_base_url(await self.config.tracemoe_url())
+        if await self.config.catalog():
+            self._start_catalog()
+        if await self.config.themes_mirror():
+            self._start_themes_mirror()
+        await self.bot.loop.run_in_executor(None, self.news_archive.load)
+        self._feed_tasks = [
+            self.bot.loop.create_task(self._poll_feed(feed)) for feed in self._news_clients
+        ]
+
+    def _start_catalog(self) -> None:
+        """Opens the local AniList catalog and starts synchronizing it in the background."""
+        if self.catalog is None:
+            self.catalog = AniListCatalog(cog_data_path(self) / "catalog.db")
+        if self._catalog_task is None or self._catalog_task.done():
+            self._catalog_task = self.bot.loop.create_task(self._catalog_loop())
 
-    @commands.command(name="anime", aliases=["ani"], usage="anime <title>", ignore_extra=False)
+    def _stop_catalog(self) -> None:
+        """Stops the catalog synchronization and closes the local catalog."""
+        if self._catalog_task is not None:
+            self._catalog_task.cancel()
+            self._catalog_task = None
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+
+    async def _catalog_loop(self) -> None:
+        """Loads the local AniList catalog into the title indexes and keeps it up to date."""
+        # Started by a command the task inherits its guild, the sync is not charged to it.
+        current_guild.set(None)
+        loop = asyncio.get_running_loop()
+        after = 0
+        while True:
+            # Read in batches off the event loop, only the columns the indexes need.
+            entries = await loop.run_in_executor(None, self.catalog.index_entries, after)
+            if not entries:
+                break
+            self.remember_media(entries)
+            after = entries[-1]["id"]
+        while True:
+            for type_ in (AniListMediaType.Anime.upper(), AniListMediaType.Manga.upper()):
+                try:
+                    await self.catalog.sync(self.anilist, type_, callback=self.remember_media)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.exception(e)
+            await asyncio.sleep(CATALOG_SYNC_INTERVAL)
+
+    def _start_themes_mirror(self) -> None:
+        """Opens the local AnimeThemes mirror and starts synchronizing it in the background."""
+        if self.themes_mirror is None:
+            self.themes_mirror = AnimeThemesMirror(cog_data_path(self) / "animethemes.db")
+        if self._themes_mirror_task is None or self._themes_mirror_task.done():
+            self._themes_mirror_task = self.bot.loop.create_task(self._themes_mirror_loop())
+
+    def _stop_themes_mirror(self) -> None:
+        """Stops the mirror synchronization and closes the local AnimeThemes mirror."""
+        if self._themes_mirror_task is not None:
+            self._themes_mirror_task.cancel()
+            self._themes_mirror_task = None
+        if self.themes_mirror is not None:
+            self.themes_mirror.close()
+            self.themes_mirror = None
+
+    async def _themes_mirror_loop(self) -> None:
+        """Keeps the local AnimeThemes mirror up to date."""
+        # Started by a command the task inherits its guild, the sync is not charged to it.
+        current_guild.set(None)
+        while True:
+            try:
+                await self.themes_mirror.sync(self.animethemes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception(e)
+            await asyncio.sleep(THEMES_SYNC_INTERVAL)
+
+    async def _poll_feed(self, feed: str) -> None:
+        """
+        Polls a news feed in the background. The news commands are answered from memory, new
+        items are posted to the subscribed channels and every item is archived.
+        """
+        client = self._news_clients[feed]
+        pushed = None
+        while True:
+            try:
+                async with client.feed.lock:
+                    await client.refresh()
+                # The items may also have been refreshed by a news command since the last poll.
+                if client.feed.items is not pushed:
+                    items = client.feed.items
+                    await self._push_news(feed, items)
+                    await self.bot.loop.run_in_executor(None, self.news_archive.add, feed, items)
+                    pushed = items
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Could not poll the %s news feed: %s", NEWS_FEEDS[feed], e)
+            await asyncio.sleep(FEED_POLL_INTERVAL)
+
+    async def _push_news(self, feed: str, items: List[Dict[str, Any]]) -> None:
+        """Posts the items of a feed that were not seen before to the channels subscribed to it."""
+        seen = self._news_seen.get(feed)
+        if seen is None:
+            guids = (await self.config.news_seen()).get(feed)
+            seen = self._news_seen[feed] = SeenItems(guids or ())
+            if guids is None:
+                # The first poll ever only marks the items already published as seen.
+                seen.update(items)
+                async with self.config.news_seen() as news_seen:
+                    news_seen[feed] = list(seen)
+                return
+        new = seen.update(items)
+        if not new:
+            return
+        # Saved before posting, so a restart never posts an item again.
+        async with self.config.news_seen() as news_seen:
+            news_seen[feed] = list(seen)
+
+        channels = []
+        for channel_id, data in (await self.config.all_channels()).items():
+            channel = self.bot.get_channel(channel_id)
+            if channel is None or feed not in data.get("news", []):
+                continue
+            if await self.bot.cog_disabled_in_guild(self, channel.guild):
+                continue
+            channels.append(channel)
+        if not channels:
+            return
+
+        for item in new[-NEWS_PUSH_LIMIT:]:
+            try:
+                embed = await self._news_embed(feed, item)
+            except Exception as e:
+                log.exception(e)
+                continue
+            for channel in channels:
+                try:
+                    await channel.send(embed=embed)
+                except discord.HTTPException as e:
+                    log.debug("Could not post the news to the channel %s: %s", channel.id, e)
+
+    async def _news_embed(
+        self, feed: str, item: Dict[str, Any], page: int = 1, pages: int = 1
+    ) -> discord.Embed:
+        """Returns the embed of a news item, without page number if it is posted on its own."""
+        if feed == "ann":
+            embed = await self.get_aninews_embed(item, page, pages)
+            site = "https://www.animenewsnetwork.com/"
+        else:
+            embed = await self.get_crunchynews_embed(item, page, pages)
+            site = "https://www.crunchyroll.com/"
+        if pages == 1:
+            embed.set_footer(text=f"Provided by {site}")
+        return embed
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """Returns the process pool used for image processing, creating it on first use."""
+        if self._process_pool is None:
+            # Spawned workers do not fork the threads of the bot, but only have the interpreter's
+            # import path, so the directory the cog package was loaded from is added to it.
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=2,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=site.addsitedir,
+                initargs=(str(Path(__file__).resolve().parent.parent),),
+            )
+        return self._process_pool
+
+    async def _season_media(self, season: str, year: int) -> Optional[List[Dict[str, Any]]]:
+        """Returns the anime of a season, reusing the listing fetched within the last hour."""
+        cached = self._season_cache.get((season, year))
+        if cached is not None and time.monotonic() - cached[0] < SEASON_CACHE_TTL:
+            return cached[1]
+        media = await self.anilist.season(season=season.upper(), seasonYear=year)
+        self.remember_media(media)
+        self._season_cache[(season, year)] = (time.monotonic(), media)
+        return media
+
+    async def _user_profile(self, username: str) -> Optional[Dict[str, Any]]:
+        """Returns the profile header and statistics of a user, cached for a few minutes."""
+        user = self._users.get(username.lower())
+        if user is None:
+            user = await self.anilist.user(page=1, perPage=1, name=username)
+            if user:
+                self._users.set(username.lower(), user)
+        return user
+
+    async def _user_favourites(self, id_: int, section: str) -> List[Dict[str, Any]]:
+        """Returns a favourites section of a user, cached with the TTL of the section."""
+        cache = self._favourites[section]
+        favourites = cache.get(id_)
+        if favourites is None:
+            favourites = await self.anilist.user_favourites(id_, section)
+            cache.set(id_, favourites)
+        return favourites
+
+    async def _mention_card(self, type_: str, title: str) -> Optional[Dict[str, Any]]:
+        """Returns the best match of a mentioned title, shared by every channel for a while."""
+        key = (type_, normalize_title(title))
+        entry = self._mention_cards.get(key)
+        if entry is None:
+            data = await self.anilist_find_media(title, type_, 1)
+            entry = await self.anilist_media_details(data[0]) if data else {}
+            self._mention_cards.set(key, entry)
+        return entry or None
+
+    async def _animethemes_anime(
+        self, anilist_id: int, mal_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Returns the AnimeThemes anime of an AniList anime, looked up by id and remembered."""
+        if self.themes_mirror is not None:
+            for site, id_ in (("AniList", anilist_id), ("MyAnimeList", mal_id)):
+                anime = self.themes_mirror.by_resource(site, id_) if id_ is not None else None
+                if anime is not None:
+                    return anime
+        slug = self.config.custom("ANIMETHEMES", str(anilist_id)).slug
+        known = await slug()
+        if known:
+            anime = await self.animethemes.anime(known, fields=THEMES_FIELDS)
+            if anime is not None:
+                return anime
+            # The anime was renamed or removed on AnimeThemes.
+            await slug.clear()
+        for site, id_ in (("AniList", anilist_id), ("MyAnimeList", mal_id)):
+            if id_ is None or (site, id_) in self._unmapped:
+                continue
+            anime = await self.animethemes.anime_by_resource(site, id_, fields=THEMES_FIELDS)
+            if anime is None:
+                self._unmapped.set((site, id_), True)
+                continue
+            await slug.set(anime["slug"])
+            return anime
+        return None
+
+    async def _media_themes(
+        self, title: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Returns the AniList anime matching a title and its AnimeThemes anime resolved by id.
+
+        The anime id is guessed from the local catalog or the title index, so AniList and
+        AnimeThemes are requested concurrently, and the guess is dropped if AniList disagrees.
+        The AniList anime of a title is remembered, so a repeated lookup makes no request.
+        """
+        key = normalize_title(title)
+        cached = self._theme_media.get(key)
+        anime = None
+        try:
+            if cached is not None:
+                media = cached or None
+                if media is not None:
+                    anime = await self._animethemes_anime(media["id"], media.get("idMal"))
+                return media, anime
+            ids = self.catalog.search(title, "ANIME", limit=1) if self.catalog is not None else []
+            guess = ids[0] if ids else self.titles.best(title, "ANIME", FUZZY_SIMILARITY)
+            if guess is not None:
+                media, guessed = await asyncio.gather(
+                    self.anilist_find_media(title, "ANIME", 1),
+                    self._animethemes_anime(guess),
+                    return_exceptions=True,
+                )
+                if isinstance(media, Exception):
+                    raise media
+                if isinstance(guessed, Exception):
+                    log.warning("Could not resolve the themes of the anime %s: %s", guess, guessed)
+                else:
+                    anime = guessed
+            else:
+                media = await self.anilist_find_media(title, "ANIME", 1)
+            media = media[0] if media else None
+            self._theme_media.set(key, media or {})
+            if media is None:
+                anime = None
+            elif anime is None or media["id"] != guess:
+                anime = await self._animethemes_anime(media["id"], media.get("idMal"))
+        except Exception as e:
+            log.warning("Could not resolve the themes of %r by id: %s", title, e)
+            return None, None
+        return media, anime
+
+    def _local_themes(self, title: str) -> Optional[Dict[str, Any]]:
+        """Returns the AnimeThemes anime of a title from the local catalog and mirror alone."""
+        if self.themes_mirror is None:
+            return None
+        ids = self.catalog.search(title, "ANIME", limit=1) if self.catalog is not None else []
+        anime = self.themes_mirror.by_resource("AniList", ids[0]) if ids else None
+        return anime or next(iter(self.themes_mirror.search(title, 1)), None)
+
+    async def _search_themes(self, title: str, limit: int) -> List[Dict[str, Any]]:
+        """Returns the AnimeThemes anime matching a title, from the local mirror if it has any."""
+        if self.themes_mirror is not None:
+            entries = self.themes_mirror.search(title, limit)
+            if entries:
+                return entries
+        data = await self.animethemes.search(title, limit, fields=THEMES_FIELDS)
+        return data.get("search").get("anime") or []
+
+    @commands.Cog.listener()
+    async def on_message_without_command(self, message: discord.Message):
+        """Answers `{{anime}}` and `<<manga>>` mentions with a compact card."""
+        mentions = find_mentions(message.content)
+        if not mentions or message.guild is None or message.author.bot:
+            return
+        current_guild.set(message.guild.id)
+        if not await self.config.guild(message.guild).mentions():
+            return
+        if await self.bot.cog_disabled_in_guild(self, message.guild):
+            return
+        for type_, title in mentions:
+            if not self._mention_throttle.allow(message.channel.id, type_, title):
+                continue
+            try:
+                entry = await self._mention_card(type_, title)
+            except Exception as e:
+                log.warning("Could not answer the mention %r: %s", title, e)
+                return
+            if entry is None:
+                continue
+            if is_adult(entry) and not message.channel.is_nsfw():
+                continue
+            await message.channel.send(embed=await self.get_media_card_embed(entry))
+
+    @commands.Cog.listener()
+    async def on_socket_response(self, msg: Dict[str, Any]):
+        """Answers the slash commands and their autocomplete."""
+        if msg.get("t") != "INTERACTION_CREATE":
+            return
+        payload = msg.get("d") or {}
+        name = (payload.get("data") or {}).get("name")
+        if name not in SLASH_COMMANDS:
+            return
+        type_, suggestion_type = SLASH_COMMANDS[name]
+        current_guild.set(int(payload["guild_id"]) if payload.get("guild_id") else None)
+        try:
+            # Interactions bypass the command checks, blacklists and disabled cogs are applied here.
+            if not await InteractionContext.allowed(self.bot, self, payload):
+                return
+            if payload.get("type") == InteractionType.Autocomplete:
+                # Answered from the local index only, keystrokes never reach AniList.
+                value = InteractionContext.focused(payload) or ""
+                await InteractionContext.autocomplete(
+                    self.bot, payload, self.suggestions.complete(value, suggestion_type)
+                )
+            elif payload.get("type") == InteractionType.ApplicationCommand:
+                ctx = await InteractionContext.from_payload(self.bot, payload)
+                await ctx.defer()
+                search, filters = InteractionContext.options(payload).get("title") or "", {}
+                if type_ in (AniListSearchType.Anime, AniListSearchType.Manga):
+                    try:
+                        search, filters = parse_media_filters(search, type_.upper())
+                    except ValueError as e:
+                        return await ctx.send(
+                            embed=discord.Embed(title=str(e), color=discord.Color.red())
+                        )
+                source = await self.anilist_search(ctx, search, type_, filters)
+                if source:
+                    embed = await source.build(source.entries[0], 1, source.get_max_pages())
+                    await ctx.send(embed=embed)
+                else:
+                    embed = discord.Embed(
+                        title=f"The {type_.lower()} `{search}` could not be found.",
+                        color=discord.Color.red(),
+                    )
+                    await ctx.send(embed=embed)
+        except Exception as e:
+            log.exception(e)
+
+    @commands.command(
+        name="anime",
+        aliases=["ani"],
+        usage="anime <title> [year:] [season:] [format:] [status:]",
+        ignore_extra=False,
+    )
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def anime(self, ctx: Context, *, title: str):
         """
         Searches for an anime with the given title and displays information about the search results such as type,
         status, episodes, description, and more!
+
+        Narrow the search with `year:2019`, `season:spring`, `format:tv,movie` or `status:airing`.
         """
+        try:
+            search, filters = parse_media_filters(title, AniListMediaType.Anime.upper())
+        except ValueError as e:
+            ctx.command.reset_cooldown(ctx)
+            raise discord.ext.commands.BadArgument(str(e))
         async with ctx.channel.typing():
-            embeds = await self.anilist_search(ctx, title, AniListSearchType.Anime)
-            if embeds:
+            source = await self.anilist_search(ctx, search, AniListSearchType.Anime, filters)
+            if source:
                 menu = menus.MenuPages(
-                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                    source=source, clear_reactions_after=True, timeout=30
                 )
                 await menu.start(ctx)
             else:
@@ -60,18 +583,27 @@ class Anime(Finder, commands.Cog):
                 )
                 await ctx.channel.send(embed=embed)
 
-    @commands.command(name="manga", usage="manga <title>", ignore_extra=False)
+    @commands.command(
+        name="manga", usage="manga <title> [year:] [format:] [status:]", ignore_extra=False
+    )
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def manga(self, ctx: Context, *, title: str):
         """
         Searches for a manga with the given title and displays information about the search results such as type,
         status, chapters, description, and more!
+
+        Narrow the search with `year:2019`, `format:manga,novel` or `status:finished`.
         """
+        try:
+            search, filters = parse_media_filters(title, AniListMediaType.Manga.upper())
+        except ValueError as e:
+            ctx.command.reset_cooldown(ctx)
+            raise discord.ext.commands.BadArgument(str(e))
         async with ctx.channel.typing():
-            embeds = await self.anilist_search(ctx, title, AniListSearchType.Manga)
-            if embeds:
+            source = await self.anilist_search(ctx, search, AniListSearchType.Manga, filters)
+            if source:
                 menu = menus.MenuPages(
-                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                    source=source, clear_reactions_after=True, timeout=30
                 )
                 await menu.start(ctx)
             else:
@@ -90,10 +622,10 @@ class Anime(Finder, commands.Cog):
         description, synonyms, and appearances!
         """
         async with ctx.channel.typing():
-            embeds = await self.anilist_search(ctx, name, AniListSearchType.Character)
-            if embeds:
+            source = await self.anilist_search(ctx, name, AniListSearchType.Character)
+            if source:
                 menu = menus.MenuPages(
-                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                    source=source, clear_reactions_after=True, timeout=30
                 )
                 await menu.start(ctx)
             else:
@@ -111,10 +643,10 @@ class Anime(Finder, commands.Cog):
         staff roles, and character roles!
         """
         async with ctx.channel.typing():
-            embeds = await self.anilist_search(ctx, name, AniListSearchType.Staff)
-            if embeds:
+            source = await self.anilist_search(ctx, name, AniListSearchType.Staff)
+            if source:
                 menu = menus.MenuPages(
-                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                    source=source, clear_reactions_after=True, timeout=30
                 )
                 await menu.start(ctx)
             else:
@@ -131,10 +663,10 @@ class Anime(Finder, commands.Cog):
         productions!
         """
         async with ctx.channel.typing():
-            embeds = await self.anilist_search(ctx, name, AniListSearchType.Studio)
-            if embeds:
+            source = await self.anilist_search(ctx, name, AniListSearchType.Studio)
+            if source:
                 menu = menus.MenuPages(
-                    source=EmbedListMenu(embeds),
+                    source=source,
                     clear_reactions_after=True,
                     timeout=30,
                 )
@@ -146,6 +678,150 @@ class Anime(Finder, commands.Cog):
                 )
                 await ctx.channel.send(embed=embed)
 
+    @commands.command(name="anilist", usage="anilist <username>", ignore_extra=False)
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def anilist_user(self, ctx: Context, *, username: str):
+        """
+        Displays the statistics and favourites of an AniList user.
+        """
+        async with ctx.channel.typing():
+            try:
+                user = await self._user_profile(username)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the user `{username}`. "
+                    f"Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not user:
+                embed = discord.Embed(
+                    title=f"The user `{username}` could not be found.", color=discord.Color.red()
+                )
+                return await ctx.channel.send(embed=embed)
+
+        nsfw = isinstance(ctx.channel, discord.channel.DMChannel) or ctx.channel.is_nsfw()
+
+        async def build(section: str, page: int, pages: int) -> discord.Embed:
+            if section == "profile":
+                return await self.get_user_embed(user, page, pages)
+            # The favourites are only requested once their page is opened.
+            try:
+                data = await self._user_favourites(user["id"], section)
+            except Exception as e:
+                log.exception(e)
+                return discord.Embed(
+                    title=f"An error occurred while loading the favourite {section} of "
+                    f'`{user.get("name")}`. Try again.',
+                    color=discord.Color.red(),
+                )
+            if not nsfw:
+                data = [entry for entry in data if not is_adult(entry)]
+            return await self.get_user_favourites_embed(user, section, data, page, pages)
+
+        menu = menus.MenuPages(
+            source=LazyEmbedMenu(["profile", *USER_FAVOURITES_SECTIONS], build),
+            clear_reactions_after=True,
+            timeout=30,
+        )
+        await menu.start(ctx)
+
+    @commands.group(
+        name="mystats",
+        usage="mystats [anime|manga]",
+        invoke_without_command=True,
+        ignore_extra=False,
+    )
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def mystats(self, ctx: Context, media: str = AniListMediaType.Anime):
+        """
+        Displays the genres, scores, completion rate and time spent of your linked AniList list.
+        """
+        if media.lower() == AniListMediaType.Anime.lower():
+            type_ = AniListMediaType.Anime.upper()
+        elif media.lower() == AniListMediaType.Manga.lower():
+            type_ = AniListMediaType.Manga.upper()
+        else:
+            ctx.command.reset_cooldown(ctx)
+            raise discord.ext.commands.BadArgument
+        account = await self.config.user(ctx.author).all()
+        if account["anilist_id"] is None:
+            ctx.command.reset_cooldown(ctx)
+            embed = discord.Embed(
+                title="You have not linked an AniList account.",
+                color=discord.Color.red(),
+                description=f"Link one with `{ctx.clean_prefix}mystats link <username>`.",
+            )
+            return await ctx.channel.send(embed=embed)
+        async with ctx.channel.typing():
+            try:
+                media_list = await self.lists.sync(self.anilist, account["anilist_id"], type_)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while loading the {type_.lower()} list of "
+                    f'`{account["anilist_name"]}`. Try again.',
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not len(media_list):
+                embed = discord.Embed(
+                    title=f'The {type_.lower()} list of `{account["anilist_name"]}` is empty.',
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            embed = await self.get_list_stats_embed(
+                account["anilist_name"], type_, list_statistics(media_list)
+            )
+            await ctx.channel.send(embed=embed)
+
+    @mystats.command(name="link", usage="link <username>", ignore_extra=False)
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def mystats_link(self, ctx: Context, *, username: str):
+        """
+        Links your AniList account.
+        """
+        async with ctx.channel.typing():
+            try:
+                user = await self._user_profile(username)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the user `{username}`. "
+                    f"Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not user:
+                embed = discord.Embed(
+                    title=f"The user `{username}` could not be found.", color=discord.Color.red()
+                )
+                return await ctx.channel.send(embed=embed)
+            previous = await self.config.user(ctx.author).anilist_id()
+            if previous is not None and previous != user["id"]:
+                self.lists.remove(previous)
+            await self.config.user(ctx.author).anilist_id.set(user["id"])
+            await self.config.user(ctx.author).anilist_name.set(user["name"])
+            embed = discord.Embed(
+                title=f'Linked the AniList account `{user["name"]}`.',
+                color=discord.Color.random(),
+                url=user.get("siteUrl"),
+            )
+            await ctx.channel.send(embed=embed)
+
+    @mystats.command(name="unlink", usage="unlink")
+    async def mystats_unlink(self, ctx: Context):
+        """
+        Unlinks your AniList account and deletes its stored lists.
+        """
+        anilist_id = await self.config.user(ctx.author).anilist_id()
+        if anilist_id is not None:
+            self.lists.remove(anilist_id)
+        await self.config.user(ctx.author).clear()
+        embed = discord.Embed(title="Unlinked your AniList account.", color=discord.Color.random())
+        await ctx.channel.send(embed=embed)
+
     @commands.command(name="random", ignore_extra=False)
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def rnd(self, ctx: Context, media: str, *, genre: str):
@@ -180,6 +856,230 @@ class Anime(Finder, commands.Cog):
                 ctx.command.reset_cooldown(ctx)
                 raise discord.ext.commands.BadArgument
 
+    @commands.command(
+        name="browse",
+        usage="browse <genre|tag> [popular|score|trending|newest|oldest]",
+        ignore_extra=False,
+    )
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def browse(self, ctx: Context, *, query: str):
+        """
+        Pages through every anime of a genre or tag, sorted by popularity, score, trends or date.
+        """
+        name, _, sort = query.rpartition(" ")
+        if not name or sort.lower() not in BROWSE_SORTS:
+            name, sort = query, "popular"
+        genre = next((genre for genre in GENRES if genre.lower() == name.lower()), None)
+        variables = {
+            "perPage": BROWSE_PER_PAGE,
+            "type": AniListMediaType.Anime.upper(),
+            "sort": [BROWSE_SORTS[sort.lower()]],
+        }
+        if not isinstance(ctx.channel, discord.channel.DMChannel):
+            if not ctx.channel.is_nsfw():
+                variables["isAdult"] = False
+
+        async def fetch(page: int) -> Tuple[List[Dict[str, Any]], int]:
+            if genre is not None:
+                data = await self.anilist.genre(genre=genre, page=page, **variables)
+            else:
+                data = await self.anilist.tag(tag=name, page=page, **variables)
+            result = data.get("data")["Page"]
+            media = result.get("media") or []
+            if not media:
+                return [], 0
+            self.remember_media(media)
+            return media, (result.get("pageInfo") or {}).get("lastPage") or 1
+
+        async def build(data: List[Dict[str, Any]], page: int, pages: int) -> discord.Embed:
+            return await self.get_browse_embed(
+                data, genre or name, (page - 1) * BROWSE_PER_PAGE + 1, page, pages
+            )
+
+        source = StreamedPageSource(fetch, build)
+        async with ctx.channel.typing():
+            try:
+                await source.prepare()
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while browsing the anime of `{name}`. Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not source.get_max_pages():
+                embed = discord.Embed(
+                    title=f"No anime with the genre or tag `{name}` could be found.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+        menu = menus.MenuPages(source=source, clear_reactions_after=True, timeout=60)
+        await menu.start(ctx)
+
+    @commands.command(name="whatanime", usage="whatanime <image attachment>", ignore_extra=False)
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    async def whatanime(self, ctx: Context):
+        """
+        Finds the anime and episode an attached screenshot is from.
+        """
+        attachment = next(
+            (
+                attachment
+                for attachment in ctx.message.attachments
+                if (attachment.content_type or "").startswith("image/")
+                or attachment.filename.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".webp"))
+            ),
+            None,
+        )
+        if attachment is None:
+            ctx.command.reset_cooldown(ctx)
+            raise discord.ext.commands.BadArgument
+        async with ctx.channel.typing():
+            try:
+                if attachment.size > self.tracemoe.max_size:
+                    raise TraceMoeImageTooLarge(attachment.size)
+                results = await self.tracemoe.search(attachment.url, attachment.content_type)
+                scene = results[0] if results else None
+                data = None
+                if scene is not None:
+                    anilist = scene.get("anilist")
+                    anilist_id = anilist.get("id") if isinstance(anilist, dict) else anilist
+                    data = await self.anilist.media_by_ids([anilist_id])
+            except TraceMoeImageTooLarge:
+                embed = discord.Embed(
+                    title=f"The image is larger than {self.tracemoe.max_size // 1024 // 1024} MB.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title="An error occurred while searching for the scene. Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not data:
+                embed = discord.Embed(
+                    title="The anime of the image could not be found.", color=discord.Color.red()
+                )
+                return await ctx.channel.send(embed=embed)
+            entry = data[0]
+            self.remember_media(data)
+            if not isinstance(ctx.channel, discord.channel.DMChannel):
+                if is_adult(entry) and not ctx.channel.is_nsfw():
+                    embed = discord.Embed(
+                        title="Error",
+                        color=discord.Color.red(),
+                        description=f"Adult content. No NSFW channel.",
+                    )
+                    embed.set_footer(text=f"Provided by https://anilist.co/")
+                    return await ctx.channel.send(embed=embed)
+            embed = await self.get_media_embed(entry)
+            minutes, seconds = divmod(int(scene.get("from") or 0), 60)
+            similarity = scene.get("similarity") or 0
+            value = (
+                f'Episode {scene.get("episode") or "N/A"} at {minutes:02d}:{seconds:02d} '
+                f"({similarity:.0%} similarity)"
+            )
+            # trace.moe considers matches below 90% similarity likely to be wrong.
+            if similarity < 0.9:
+                value += "\nThe similarity is low, the match may be wrong."
+            if scene.get("video"):
+                value += f'\n[Scene Preview]({scene.get("video")})'
+            embed.insert_field_at(0, name="Scene", value=value, inline=False)
+            await ctx.channel.send(embed=embed)
+
+    @commands.command(name="watchorder", usage="watchorder <anime>", ignore_extra=False)
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def watchorder(self, ctx: Context, *, anime: str):
+        """
+        Displays the order in which to watch the prequels, sequels and side stories of an anime.
+        """
+        async with ctx.channel.typing():
+            try:
+                data = await self.anilist_find_media(anime, AniListMediaType.Anime.upper(), 1)
+                if data:
+                    data = await self.relations.watch_order(data[0]["id"])
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the watch order of `{anime}`. "
+                    f"Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if data:
+                if not isinstance(ctx.channel, discord.channel.DMChannel):
+                    if not ctx.channel.is_nsfw() and any(is_adult(entry) for entry in data):
+                        embed = discord.Embed(
+                            title="Error",
+                            color=discord.Color.red(),
+                            description=f"Adult content. No NSFW channel.",
+                        )
+                        embed.set_footer(text=f"Provided by https://anilist.co/")
+                        return await ctx.channel.send(embed=embed)
+                title = get_media_title(data[0]["title"])
+                chunks = [data[i : i + 15] for i in range(0, len(data), 15)]
+                embeds = []
+                for page, chunk in enumerate(chunks):
+                    embed = await self.get_watch_order_embed(
+                        chunk, title, page * 15 + 1, page + 1, len(chunks)
+                    )
+                    embeds.append(embed)
+                menu = menus.MenuPages(
+                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                )
+                await menu.start(ctx)
+            else:
+                embed = discord.Embed(
+                    title=f"The anime `{anime}` could not be found.", color=discord.Color.red()
+                )
+                await ctx.channel.send(embed=embed)
+
+    @commands.command(name="similar", usage="similar <anime>", ignore_extra=False)
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def similar_(self, ctx: Context, *, anime: str):
+        """
+        Displays the anime with the most similar genres and tags among the anime known to the bot.
+        """
+        async with ctx.channel.typing():
+            try:
+                data = await self.anilist_find_media(anime, AniListMediaType.Anime.upper(), 1)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the anime `{anime}`. Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            similar = self.similar.similar(data[0]["id"], 30) if data else []
+            if not isinstance(ctx.channel, discord.channel.DMChannel):
+                if not ctx.channel.is_nsfw():
+                    similar = [
+                        (id_, score)
+                        for id_, score in similar
+                        if not is_adult(self.similar.info(id_))
+                    ]
+            if similar:
+                title = get_media_title(data[0]["title"])
+                entries = [(self.similar.info(id_), score) for id_, score in similar]
+                chunks = [entries[i : i + 10] for i in range(0, len(entries), 10)]
+                embeds = []
+                for page, chunk in enumerate(chunks):
+                    embed = await self.get_similar_embed(
+                        chunk, title, page * 10 + 1, page + 1, len(chunks)
+                    )
+                    embeds.append(embed)
+                menu = menus.MenuPages(
+                    source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+                )
+                await menu.start(ctx)
+            else:
+                embed = discord.Embed(
+                    title=f"No similar anime for `{anime}` found.", color=discord.Color.red()
+                )
+                await ctx.channel.send(embed=embed)
+
     @commands.command(name="themes", usage="themes <anime>", ignore_extra=False)
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def themes(self, ctx: Context, *, anime: str):
@@ -187,14 +1087,37 @@ class Anime(Finder, commands.Cog):
         Searches for the openings and endings of the given anime and displays them.
         """
         async with ctx.channel.typing():
-            data = await self.animethemes.search(anime, 15)
-            if data.get("search").get("anime"):
+            media, anime_ = await self._media_themes(anime)
+            if media and anime_ and anime_.get("themes"):
+                try:
+                    embed = await self.get_media_themes_embed(media, anime_)
+                    if not isinstance(ctx.channel, discord.channel.DMChannel):
+                        if (
+                            is_adult(media) or is_adult(anime_.get("themes")[0]["entries"][0])
+                        ) and not ctx.channel.is_nsfw():
+                            embed = discord.Embed(
+                                title="Error",
+                                color=discord.Color.red(),
+                                description=f"Adult content. No NSFW channel.",
+                            )
+                            embed.set_footer(text=f"Provided by https://animethemes.moe/")
+                except Exception as e:
+                    log.exception(e)
+                    embed = discord.Embed(
+                        title="Error",
+                        color=discord.Color.red(),
+                        description=f"An error occurred while loading the embed for the anime.",
+                    )
+                    embed.set_footer(text=f"Provided by https://animethemes.moe/")
+                return await ctx.channel.send(embed=embed)
+
+            # Titles unknown to AniList or without AnimeThemes resource fall back to a search.
+            results = await self._search_themes(anime, 15)
+            if results:
                 embeds = []
-                for page, entry in enumerate(data.get("search").get("anime")):
+                for page, entry in enumerate(results):
                     try:
-                        embed = await self.get_themes_embed(
-                            entry, page + 1, len(data.get("search").get("anime"))
-                        )
+                        embed = await self.get_themes_embed(entry, page + 1, len(results))
                         if not isinstance(ctx.channel, discord.channel.DMChannel):
                             if (
                                 is_adult(entry.get("themes")[0]["entries"][0])
@@ -207,7 +1130,7 @@ class Anime(Finder, commands.Cog):
                                 )
                                 embed.set_footer(
                                     text=f"Provided by https://animethemes.moe/ • Page {page + 1}/"
-                                    f'{len(data.get("search").get("anime"))}'
+                                    f"{len(results)}"
                                 )
                     except Exception as e:
                         log.exception(e)
@@ -218,7 +1141,7 @@ class Anime(Finder, commands.Cog):
                         )
                         embed.set_footer(
                             text=f"Provided by https://animethemes.moe/ • Page "
-                            f'{page + 1}/{len(data.get("search").get("anime"))}'
+                            f"{page + 1}/{len(results)}"
                         )
                     embeds.append(embed)
                 menu = menus.MenuPages(
@@ -238,57 +1161,43 @@ class Anime(Finder, commands.Cog):
         Displays a specific opening or ending of the given anime.
         """
         async with ctx.channel.typing():
-            data = await self.animethemes.search(anime, 1)
-            if data.get("search").get("anime"):
-                anime_ = data.get("search").get("anime")[0]
-                if anime_.get("themes"):
-                    for entry in anime_.get("themes"):
-                        if (
-                            theme.upper() == entry.get("slug")
-                            or (theme.upper() == "OP" and entry.get("slug") == "OP1")
-                            or (theme.upper() == "ED" and entry.get("slug") == "ED1")
-                            or (theme.upper() == "OP1" and entry.get("slug") == "OP")
-                            or (theme.upper() == "ED1" and entry.get("slug") == "ED")
-                        ):
-                            try:
-                                embed = await self.get_theme_embed(anime_, entry)
-                                if not isinstance(ctx.channel, discord.channel.DMChannel):
-                                    if (
-                                        is_adult(entry.get("entries")[0])
-                                        and not ctx.channel.is_nsfw()
-                                    ):
-                                        embed = discord.Embed(
-                                            title="Error",
-                                            color=discord.Color.red(),
-                                            description=f"Adult content. No NSFW channel.",
-                                        )
-                                        embed.set_footer(
-                                            text=f"Provided by https://animethemes.moe/"
-                                        )
-                                        return await ctx.channel.send(embed=embed)
-                            except Exception as e:
-                                log.exception(e)
+            anime_ = self._local_themes(anime)
+            if anime_ is None:
+                _, anime_ = await self._media_themes(anime)
+            if anime_ is None:
+                anime_ = next(iter(await self._search_themes(anime, 1)), None)
+            if anime_:
+                match = anime_.get("theme_slugs", {}).get(normalize_slug(theme))
+                if match:
+                    entry, basename = match
+                    try:
+                        embed = await self.get_theme_embed(anime_, entry)
+                        if not isinstance(ctx.channel, discord.channel.DMChannel):
+                            if is_adult(entry.get("entries")[0]) and not ctx.channel.is_nsfw():
                                 embed = discord.Embed(
                                     title="Error",
                                     color=discord.Color.red(),
-                                    description=f"An error occurred while loading the embed for the theme.",
+                                    description=f"Adult content. No NSFW channel.",
                                 )
                                 embed.set_footer(text=f"Provided by https://animethemes.moe/")
-                            await ctx.channel.send(embed=embed)
-                            return await ctx.channel.send(
-                                f'https://animethemes.moe/video/{entry.get("entries")[0]["videos"][0]["basename"]}'
-                            )
-                    embed = discord.Embed(
-                        title=f"Cannot find `{theme.upper()}` for the anime `{anime}`.",
-                        color=discord.Color.red(),
-                    )
-                    await ctx.channel.send(embed=embed)
-                else:
-                    embed = discord.Embed(
-                        title=f"Cannot find `{theme.upper()}` for the anime `{anime}`.",
-                        color=discord.Color.red(),
-                    )
+                                return await ctx.channel.send(embed=embed)
+                    except Exception as e:
+                        log.exception(e)
+                        embed = discord.Embed(
+                            title="Error",
+                            color=discord.Color.red(),
+                            description=f"An error occurred while loading the embed for the theme.",
+                        )
+                        embed.set_footer(text=f"Provided by https://animethemes.moe/")
                     await ctx.channel.send(embed=embed)
+                    if basename:
+                        return await ctx.channel.send(f"https://animethemes.moe/video/{basename}")
+                    return
+                embed = discord.Embed(
+                    title=f"Cannot find `{theme.upper()}` for the anime `{anime}`.",
+                    color=discord.Color.red(),
+                )
+                await ctx.channel.send(embed=embed)
             else:
                 embed = discord.Embed(
                     title=f"No theme for the anime `{anime}` found.", color=discord.Color.red()
@@ -350,6 +1259,56 @@ class Anime(Finder, commands.Cog):
                 )
                 await ctx.channel.send(embed=embed)
 
+    @commands.command(name="countdown", usage="countdown <anime>", ignore_extra=False)
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    async def countdown(self, ctx: Context, *, anime: str):
+        """
+        Posts a countdown to the next episode of an anime that stays up to date until it airs.
+        """
+        async with ctx.channel.typing():
+            try:
+                data = await self.anilist_find_media(anime, AniListMediaType.Anime.upper(), 1)
+                if data:
+                    # The next episode is not stored by the local catalog.
+                    data[0] = await self.anilist_media_details(data[0])
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the anime `{anime}`. Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if not data:
+                embed = discord.Embed(
+                    title=f"The anime `{anime}` could not be found.", color=discord.Color.red()
+                )
+                return await ctx.channel.send(embed=embed)
+            entry = data[0]
+            if not isinstance(ctx.channel, discord.channel.DMChannel):
+                if is_adult(entry) and not ctx.channel.is_nsfw():
+                    embed = discord.Embed(
+                        title="Error",
+                        color=discord.Color.red(),
+                        description=f"Adult content. No NSFW channel.",
+                    )
+                    embed.set_footer(text=f"Provided by https://anilist.co/")
+                    return await ctx.channel.send(embed=embed)
+            episode = entry.get("nextAiringEpisode") or {}
+            if not episode.get("timeUntilAiring"):
+                embed = discord.Embed(
+                    title=f'`{get_media_title(entry.get("title"))}` has no upcoming episode.',
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+
+            airing_at = episode.get("airingAt") or int(time.time()) + episode["timeUntilAiring"]
+
+            async def render(remaining: float) -> discord.Embed:
+                return await self.get_countdown_embed(entry, remaining)
+
+            message = await ctx.channel.send(embed=await render(airing_at - time.time()))
+            self.countdowns.add(message, airing_at, render)
+
     @commands.command(name="last", usage="last", ignore_extra=False)
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def last(self, ctx: Context):
@@ -448,6 +1407,84 @@ class Anime(Finder, commands.Cog):
                 )
                 await ctx.channel.send(embed=embed)
 
+    @commands.group(name="news", usage="news", invoke_without_command=True, ignore_extra=False)
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def news(self, ctx: Context):
+        """
+        Displays the latest anime news from Anime News Network and Crunchyroll in one timeline.
+        """
+        async with ctx.channel.typing():
+            feeds = list(self._news_clients)
+            # Both feeds are requested at once, the slower one decides how long it takes.
+            results = await asyncio.gather(
+                *(self._news_clients[feed].news(count=15) for feed in feeds),
+                return_exceptions=True,
+            )
+            items = {}
+            for feed, result in zip(feeds, results):
+                if isinstance(result, Exception):
+                    log.warning("Could not get the %s news: %s", NEWS_FEEDS[feed], result)
+                elif result:
+                    items[feed] = result
+            if not items and any(isinstance(result, Exception) for result in results):
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the anime news. Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            timeline = merge_news(items)
+            if not timeline:
+                embed = discord.Embed(
+                    title=f"The anime news could not be found.", color=discord.Color.red()
+                )
+                return await ctx.channel.send(embed=embed)
+
+        async def build(entry: Tuple[str, Dict[str, Any]], page: int, pages: int):
+            feed, item = entry
+            try:
+                return await self._news_embed(feed, item, page, pages)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title="Error",
+                    color=discord.Color.red(),
+                    description=f"An error occurred while loading the embed for the news.",
+                )
+                embed.set_footer(text=f"Page {page}/{pages}")
+                return embed
+
+        menu = menus.MenuPages(
+            source=LazyEmbedMenu(timeline, build), clear_reactions_after=True, timeout=30
+        )
+        await menu.start(ctx)
+
+    @news.command(name="search", usage="search <terms>")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def news_search(self, ctx: Context, *, terms: str):
+        """
+        Searches every news article seen by the bot for the given terms.
+
+        Articles matching the most terms come first, recent articles before older ones.
+        """
+        results = self.news_archive.search(terms, 30)
+        if not results:
+            embed = discord.Embed(
+                title=f"No news about `{terms}` found.", color=discord.Color.red()
+            )
+            return await ctx.channel.send(embed=embed)
+        entries = [item for item, _ in results]
+        chunks = [entries[i : i + 10] for i in range(0, len(entries), 10)]
+        embeds = []
+        for page, chunk in enumerate(chunks):
+            embed = await self.get_news_search_embed(
+                chunk, f"News about {terms}", page * 10 + 1, page + 1, len(chunks)
+            )
+            embeds.append(embed)
+        menu = menus.MenuPages(
+            source=EmbedListMenu(embeds), clear_reactions_after=True, timeout=30
+        )
+        await menu.start(ctx)
+
     @commands.command(
         name="crunchynews", aliases=["crnews"], usage="crunchynews", ignore_extra=False
     )
@@ -512,6 +1549,7 @@ class Anime(Finder, commands.Cog):
                 data = await self.anilist.trending(
                     page=1, perPage=10, type=type_, sort="TRENDING_DESC"
                 )
+                self.remember_media(data)
             except Exception as e:
                 log.exception(e)
                 embed = discord.Embed(
@@ -556,3 +1594,223 @@ class Anime(Finder, commands.Cog):
                     title=f"No trending {type_.lower()} found.", color=discord.Color.red()
                 )
                 await ctx.channel.send(embed=embed)
+
+    @commands.command(
+        name="season", usage="season [winter|spring|summer|fall] [year]", ignore_extra=False
+    )
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    @commands.bot_has_permissions(attach_files=True)
+    async def season(
+        self, ctx: Context, season: Optional[str] = None, year: Optional[int] = None
+    ):
+        """
+        Displays a chart with the covers of every anime of the given season.
+        """
+        if season is not None and season.isdigit() and year is None:
+            season, year = None, int(season)
+        season_ = get_season(season)
+        if season_ is None:
+            ctx.command.reset_cooldown(ctx)
+            raise discord.ext.commands.BadArgument
+        year = year or datetime.date.today().year
+        async with ctx.channel.typing():
+            try:
+                media = await self._season_media(season_, year)
+            except Exception as e:
+                log.exception(e)
+                embed = discord.Embed(
+                    title=f"An error occurred while searching for the {season_} {year} anime. "
+                    f"Try again.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+            if media and not isinstance(ctx.channel, discord.channel.DMChannel):
+                if not ctx.channel.is_nsfw():
+                    media = [entry for entry in media if not is_adult(entry)]
+            if not media:
+                embed = discord.Embed(
+                    title=f"The {season_} {year} anime could not be found.",
+                    color=discord.Color.red(),
+                )
+                return await ctx.channel.send(embed=embed)
+
+            key = chart_key(season_, year, media)
+            chart = self.covers.get(key, ".chart.jpg")
+            if chart is None:
+                try:
+                    covers = await self.covers.thumbnails(
+                        await self.transport.session(),
+                        self._executor(),
+                        [(entry.get("coverImage") or {}).get("large") for entry in media],
+                    )
+                    chart = self.covers.file(key, ".chart.jpg")
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._executor(),
+                        render_chart,
+                        covers,
+                        [entry.get("title")["romaji"] for entry in media],
+                        str(chart),
+                        f"{season_} {year} - {len(media)} anime",
+                    )
+                except Exception as e:
+                    log.exception(e)
+                    embed = discord.Embed(
+                        title=f"An error occurred while rendering the {season_} {year} chart.",
+                        color=discord.Color.red(),
+                    )
+                    return await ctx.channel.send(embed=embed)
+
+            embed = discord.Embed(title=f"{season_} {year}", color=discord.Color.random())
+            embed.set_image(url="attachment://season.jpg")
+            embed.set_footer(text="Provided by https://anilist.co/")
+            await ctx.channel.send(
+                embed=embed, file=discord.File(str(chart), filename="season.jpg")
+            )
+
+    @commands.group(name="animeset")
+    async def animeset(self, ctx: Context):
+        """
+        Configures the anime cog.
+        """
+
+    @animeset.command(name="mentions", usage="mentions <true|false>")
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def animeset_mentions(self, ctx: Context, enabled: bool):
+        """
+        Enables or disables the cards answering `{{anime}}` and `<<manga>>` in this server.
+        """
+        await self.config.guild(ctx.guild).mentions.set(enabled)
+        if enabled:
+            await ctx.send(
+                "Anime written as `{{title}}` and manga written as `<<title>>` are answered "
+                "in this server."
+            )
+        else:
+            await ctx.send("Mentions are no longer answered in this server.")
+
+    @animeset.command(name="news", usage="news <ann|crunchyroll> [channel]")
+    @commands.guild_only()
+    @commands.admin_or_permissions(manage_guild=True)
+    async def animeset_news(
+        self, ctx: Context, feed: str, channel: Optional[discord.TextChannel] = None
+    ):
+        """
+        Subscribes a channel to a news feed, or unsubscribes it if it already is.
+
+        New articles of `ann` (Anime News Network) or `crunchyroll` are posted in the channel as
+        they are published. The current channel is used if none is given.
+        """
+        feed = feed.lower()
+        if feed not in NEWS_FEEDS:
+            raise discord.ext.commands.BadArgument(
+                f"The news feed has to be one of {', '.join(NEWS_FEEDS)}."
+            )
+        channel = channel or ctx.channel
+        async with self.config.channel(channel).news() as feeds:
+            subscribed = feed not in feeds
+            if subscribed:
+                feeds.append(feed)
+            else:
+                feeds.remove(feed)
+        if subscribed:
+            await ctx.send(f"New {NEWS_FEEDS[feed]} articles are posted in {channel.mention}.")
+        else:
+            await ctx.send(
+                f"{NEWS_FEEDS[feed]} articles are no longer posted in {channel.mention}."
+            )
+
+    @animeset.command(name="catalog", usage="catalog <true|false>")
+    @commands.is_owner()
+    async def animeset_catalog(self, ctx: Context, enabled: bool):
+        """
+        Enables or disables the local AniList catalog.
+
+        The catalog is synchronized in the background and answers anime and manga searches locally,
+        AniList is then only asked for the details of the matches.
+        """
+        await self.config.catalog.set(enabled)
+        if enabled:
+            self._start_catalog()
+            await ctx.send(
+                f"The local catalog is enabled and contains {len(self.catalog)} entries. "
+                f"It is synchronized in the background."
+            )
+        else:
+            self._stop_catalog()
+            await ctx.send("The local catalog is disabled.")
+
+    @animeset.command(name="themes", usage="themes <true|false>")
+    @commands.is_owner()
+    async def animeset_themes(self, ctx: Context, enabled: bool):
+        """
+        Enables or disables the local AnimeThemes mirror.
+
+        The mirror is synchronized in the background and answers the theme commands locally,
+        AnimeThemes is then only asked for the anime the mirror does not know.
+        """
+        await self.config.themes_mirror.set(enabled)
+        if enabled:
+            self._start_themes_mirror()
+            await ctx.send(
+                f"The local AnimeThemes mirror is enabled and contains {len(self.themes_mirror)} "
+                f"anime. It is synchronized in the background."
+            )
+        else:
+            self._stop_themes_mirror()
+            await ctx.send("The local AnimeThemes mirror is disabled.")
+
+    @animeset.command(name="http", usage="http")
+    @commands.is_owner()
+    async def animeset_http(self, ctx: Context):
+        """
+        Displays the requests, errors and connections of the cog per host since it was loaded.
+        """
+        if not self.transport.counters:
+            return await ctx.send("No requests were made yet.")
+        lines = []
+        for host, counter in sorted(self.transport.counters.items()):
+            requests = int(counter["requests"])
+            latency = counter["seconds"] / requests * 1000 if requests else 0
+            lines.append(
+                f"**{host}:** {requests} requests • {int(counter['errors'])} errors • "
+                f"{latency:.0f} ms average • {int(counter['connections'])} connections opened, "
+                f"{int(counter['reused'])} reused"
+            )
+        embed = discord.Embed(
+            title="HTTP transport", color=discord.Color.random(), description="\n".join(lines)
+        )
+        await ctx.send(embed=embed)
+
+    @animeset.command(name="tracemoe", usage="tracemoe [url]")
+    @commands.is_owner()
+    async def animeset_tracemoe(self, ctx: Context, url: str = TRACEMOE_BASE_URL):
+        """
+        Sets the trace.moe compatible API `[p]whatanime` searches with.
+
+        Without an url the public trace.moe API is used again.
+        """
+        await self.config.tracemoe_url.set(url)
+        self.tracemoe.set_base_url(url)
+        await ctx.send(f"Scenes are searched with <{url}>.")
+
+    @animeset.command(name="slash", usage="slash <true|false>")
+    @commands.is_owner()
+    async def animeset_slash(self, ctx: Context, enabled: bool):
+        """
+        Registers or removes the /anime, /manga and /character slash commands.
+
+        Their autocomplete is answered from the titles the cog has already seen or synchronized.
+        """
+        async with ctx.typing():
+            registered = await self.config.slash_commands()
+            if enabled:
+                registered = await register_commands(self.bot, SLASH_COMMAND_PAYLOADS)
+                await self.config.slash_commands.set(registered)
+                await ctx.send(
+                    "The slash commands are registered, they can take a while to show up."
+                )
+            else:
+                await unregister_commands(self.bot, registered)
+                await self.config.slash_commands.set({})
+                await ctx.send("The slash commands are removed.")
@@ -1,10 +1,11 @@
+import asyncio
 import datetime
 import re
 from abc import ABC
+from collections import OrderedDict
 from html.parser import HTMLParser
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional, Tuple
 
-import aiohttp
 from redbot.vendored.discord.ext import menus
 
 ANILIST_API_ENDPOINT = "https://graphql.anilist.co"
@@ -15,126 +16,39 @@ ANIMENEWSNETWORK_NEWS_FEED_ENDPOINT = "https://www.animenewsnetwork.com/newsroom
 
 CRUNCHYROLL_NEWS_FEED_ENDPOINT = "https://www.crunchyroll.com/newsrss?lang=enEN"
 
-
-class AnimeThemesException(Exception):
-    """
-    Base exception class for the AnimeThemes API wrapper.
-    """
-
-
-class AnimeThemesAPIError(AnimeThemesException):
-    """
-    Exception due to an error response from the AnimeThemes API.
-    """
-
-    def __init__(self, msg: str, status: int) -> None:
-        """
-        Initializes the AnimeThemesAPIError exception.
-        Args:
-            msg (str): The error message.
-            status (int): The status code.
-        """
-        super().__init__(msg + " - Status: " + str(status))
-
-
-class AnimeThemesError(AnimeThemesException):
-    """
-    Exceptions that do not involve the API.
-    """
-
-
-class AnimeThemesClient:
-    """
-    Asynchronous wrapper client for the AnimeThemes API.
-    This class is used to interact with the API.
-    Attributes:
-        session (aiohttp.ClientSession): An aiohttp session.
-        headers (dict): HTTP headers used in the request.
-    """
-
-    def __init__(
-        self, session: Optional[aiohttp.ClientSession] = None, headers: Dict[str, Any] = None
-    ) -> None:
-        """
-        Initializes the AnimeThemesClient.
-        Args:
-            session (aiohttp.ClientSession, optional): An aiohttp session.
-            headers (dict, optional): HTTP headers used in the request.
-        """
-        self.session = session
-        self.headers = headers or {}
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
-        await self.close()
-
-    async def close(self) -> None:
-        """
-        Closes the aiohttp session.
-        """
-        if self.session is not None:
-            await self.session.close()
-
-    async def _session(self) -> aiohttp.ClientSession:
-        """
-        Gets an aiohttp session by creating it if it does not already exist or the previous session is closed.
-        Returns:
-            aiohttp.ClientSession: An aiohttp session.
-        """
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
-
-    async def _request(self, url: str) -> Dict[str, Any]:
-        """
-        Makes a request to the AnimeThemes API.
-        Args:
-            url (str): The url used for the request.
-        Returns:
-            dict: Dictionary with the data from the response.
-        Raises:
-            AnimeThemesAPIError: If the response contains an error.
-        """
-        session = await self._session()
-        response = await session.get(url=url, headers=self.headers)
-        data = await response.json()
-        if data.get("errors"):
-            raise AnimeThemesAPIError(
-                data.get("errors")[0]["detail"], data.get("errors")[0]["status"]
-            )
-        return data
-
-    @staticmethod
-    async def get_url(endpoint: str, parameters: str) -> str:
-        """
-        Creates the request url for the animethemes endpoints.
-        Args:
-            endpoint (str): The API endpoint.
-            parameters (str): The query parameters.
-        """
-        return f"{ANIMETHEMES_BASE_URL}/{endpoint}{parameters}"
-
-    async def search(
-        self, query: str, limit: Optional[int] = 5, fields: Optional[List[str]] = None
-    ) -> Dict[str, Any]:
-        """
-        Returns relevant resources by search criteria.
-        Args:
-            query (str): The search query.
-            limit (int, optional): The number of each resource to return (1-5).
-            fields (str, optional): The list of resources to include.
-        Returns:
-            dict: The data about the requested resources.
-        """
-        q = query.replace(" ", "%20")
-        if fields is None:
-            fields = []
-        parameters = f'?q={q}&limit={limit}&fields={",".join(fields)}'
-        url = await self.get_url("search", parameters)
-        data = await self._request(url=url)
-        return data
+TRACEMOE_BASE_URL = "https://api.trace.moe"
+
+MEDIA_FILTER = re.compile(r"(?<!\S)(year|season|format|status):(\S+)", re.IGNORECASE)
+
+MEDIA_FORMATS = {
+    "tv": "TV",
+    "short": "TV_SHORT",
+    "tv_short": "TV_SHORT",
+    "movie": "MOVIE",
+    "special": "SPECIAL",
+    "ova": "OVA",
+    "ona": "ONA",
+    "music": "MUSIC",
+    "manga": "MANGA",
+    "novel": "NOVEL",
+    "ln": "NOVEL",
+    "oneshot": "ONE_SHOT",
+    "one_shot": "ONE_SHOT",
+}
+
+# The AniList formats of each media type, the others never match.
+MANGA_FORMATS = ("MANGA", "NOVEL", "ONE_SHOT")
+
+MEDIA_STATUSES = {
+    "finished": "FINISHED",
+    "airing": "RELEASING",
+    "releasing": "RELEASING",
+    "upcoming": "NOT_YET_RELEASED",
+    "unreleased": "NOT_YET_RELEASED",
+    "cancelled": "CANCELLED",
+    "canceled": "CANCELLED",
+    "hiatus": "HIATUS",
+}
 
 
 class HTMLFilter(HTMLParser, ABC):
@@ -163,6 +77,13 @@ class AniListMediaType:
     Manga = "Manga"
 
 
+class AniListSeason:
+    Winter = "Winter"
+    Spring = "Spring"
+    Summer = "Summer"
+    Fall = "Fall"
+
+
 class EmbedListMenu(menus.ListPageSource):
     """
     Paginated embed menu.
@@ -181,6 +102,90 @@ class EmbedListMenu(menus.ListPageSource):
         return embeds
 
 
+class LazyEmbedMenu(menus.ListPageSource):
+    """
+    Paginated embed menu whose pages are built when they are opened.
+    """
+
+    def __init__(self, entries, build):
+        """
+        Initializes the LazyEmbedMenu with the page entries and an async page builder.
+        """
+        super().__init__(entries, per_page=1)
+        self.build = build
+
+    async def format_page(self, menu, entry):
+        """
+        Builds the page.
+        """
+        return await self.build(entry, menu.current_page + 1, self.get_max_pages())
+
+
+class StreamedPageSource(menus.PageSource):
+    """
+    Paginated embed menu over a remote result set that is fetched one page at a time.
+
+    `fetch(page)` returns the entries of a page and the number of pages. A page is fetched when
+    it is opened, the following page is prefetched while the current one is read, and only the
+    `window` most recently used pages are kept.
+    """
+
+    def __init__(self, fetch, build, window: int = 3):
+        """
+        Initializes the StreamedPageSource with the page fetcher and an async page builder.
+        """
+        self.fetch = fetch
+        self.build = build
+        self.window = window
+        self._pages: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+        self._max_pages: Optional[int] = None
+
+    def _load(self, page_number: int) -> asyncio.Future:
+        """
+        Returns the future of a page, fetching it if it is not kept.
+        """
+        future = self._pages.get(page_number)
+        if future is None or future.cancelled() or (future.done() and future.exception()):
+            future = asyncio.ensure_future(self.fetch(page_number + 1))
+            # Prefetched pages that fail are fetched again when opened.
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._pages[page_number] = future
+        self._pages.move_to_end(page_number)
+        while len(self._pages) > self.window:
+            _, evicted = self._pages.popitem(last=False)
+            evicted.cancel()
+        return future
+
+    async def prepare(self):
+        """
+        Fetches the first page, which tells how many pages there are.
+        """
+        if self._max_pages is None:
+            _, self._max_pages = await self._load(0)
+
+    def is_paginating(self):
+        return True
+
+    def get_max_pages(self):
+        return self._max_pages
+
+    async def get_page(self, page_number):
+        """
+        Returns the entries of a page and prefetches the next page.
+        """
+        entries, self._max_pages = await self._load(page_number)
+        if page_number + 1 < self._max_pages:
+            self._load(page_number + 1)
+        return page_number, entries
+
+    async def format_page(self, menu, page):
+        """
+        Builds the page.
+        """
+        page_number, entries = page
+        return await self.build(entries, page_number + 1, self._max_pages)
+
+
 def get_media_title(data: Dict[str, Any]) -> str:
     """
     Returns the media title.
@@ -292,6 +297,67 @@ def format_date(day: int, month: int, year: int) -> str:
     return date
 
 
+def get_season(name: Optional[str] = None, date: Optional[datetime.date] = None) -> Optional[str]:
+    """Returns the anilist season for the given name, or the season of the given date."""
+    if name is not None:
+        seasons = {
+            "winter": AniListSeason.Winter,
+            "spring": AniListSeason.Spring,
+            "summer": AniListSeason.Summer,
+            "fall": AniListSeason.Fall,
+            "autumn": AniListSeason.Fall,
+        }
+        return seasons.get(name.lower())
+    date = date or datetime.date.today()
+    return [
+        AniListSeason.Winter,
+        AniListSeason.Spring,
+        AniListSeason.Summer,
+        AniListSeason.Fall,
+    ][(date.month - 1) // 3]
+
+
+def parse_media_filters(text: str, type_: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Splits the `year:`, `season:`, `format:` and `status:` filters off a search and returns the
+    remaining search with the matching anilist media arguments.
+    """
+    filters: Dict[str, Any] = {}
+    for key, value in MEDIA_FILTER.findall(text):
+        key, value = key.lower(), value.lower()
+        if key == "year":
+            if not value.isdigit() or not 1900 <= int(value) <= 2100:
+                raise ValueError(f"`{value}` is not a valid year.")
+            if type_ == "ANIME":
+                filters["seasonYear"] = int(value)
+            else:
+                # Manga have no seasons, their fuzzy start date is matched instead.
+                filters["startDate_greater"] = int(value) * 10000 - 1
+                filters["startDate_lesser"] = (int(value) + 1) * 10000
+        elif key == "season":
+            season = get_season(value)
+            if type_ != "ANIME":
+                raise ValueError("Only anime can be filtered by season.")
+            if season is None:
+                raise ValueError(f"`{value}` is not a valid season.")
+            filters["season"] = season.upper()
+        elif key == "format":
+            formats = [MEDIA_FORMATS.get(format_) for format_ in value.split(",")]
+            if None in formats:
+                raise ValueError(f"`{value}` is not a valid format.")
+            if any((format_ in MANGA_FORMATS) != (type_ == "MANGA") for format_ in formats):
+                raise ValueError(f"`{value}` is not a valid {type_.lower()} format.")
+            filters["format_in"] = formats
+        elif key == "status":
+            if value not in MEDIA_STATUSES:
+                raise ValueError(f"`{value}` is not a valid status.")
+            filters["status"] = MEDIA_STATUSES[value]
+    search = " ".join(MEDIA_FILTER.sub(" ", text).split())
+    if filters and not search:
+        raise ValueError("A title to search for is required.")
+    return search, filters
+
+
 def is_adult(data: Dict[str, Any]) -> bool:
     """
     Checks if the media is intended only for 18+ adult audiences.
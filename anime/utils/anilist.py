@@ -1,9 +1,15 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Union
+import math
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Union
 
 import aiohttp
 
 from ..utility import ANILIST_API_ENDPOINT
+from .limiter import FairLimiter
+from .transport import HTTPTransport
 
 log = logging.getLogger("red.historian.anime")
 
@@ -19,11 +25,46 @@ class AnilistAPIError(AnilistException):
         super().__init__(f"{msg} - Status: {str(status)} - Locations: {locations}")
 
 
+MAX_RATE_LIMIT_RETRIES = 2
+
+# Seconds waited after a rate limited request without a usable `Retry-After`, and at most.
+RATE_LIMIT_WAIT = 60.0
+MAX_RATE_LIMIT_WAIT = 300.0
+
+USER_FAVOURITES_SECTIONS = ("anime", "manga", "characters", "staff", "studios")
+
+
+def retry_after(value: Optional[str]) -> float:
+    """Returns the seconds to wait from a `Retry-After` header, given in seconds or as a date."""
+    if not value:
+        return RATE_LIMIT_WAIT
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return RATE_LIMIT_WAIT
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        seconds = (date - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return RATE_LIMIT_WAIT
+    return min(max(seconds, 0.0), MAX_RATE_LIMIT_WAIT)
+
+
 class AniListClient:
     """Asynchronous wrapper client for the AniList API."""
 
-    def __init__(self, session: Optional[aiohttp.ClientSession] = None) -> None:
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        limiter: Optional[FairLimiter] = None,
+        transport: Optional[HTTPTransport] = None,
+    ) -> None:
         self.session = session
+        self.limiter = limiter or FairLimiter()
+        self.transport = transport
 
     async def __aenter__(self):
         return self
@@ -38,6 +79,8 @@ class AniListClient:
 
     async def _session(self) -> aiohttp.ClientSession:
         """Gets an aiohttp session by creating it if it does not already exist or the previous session is closed."""
+        if self.transport is not None:
+            return await self.transport.session()
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
         return self.session
@@ -45,10 +88,19 @@ class AniListClient:
     async def _request(self, query: str, **variables: Union[str, Any]) -> Dict[str, Any]:
         """Makes a request to the AniList API."""
         session = await self._session()
-        response = await session.post(
-            ANILIST_API_ENDPOINT, json={"query": query, "variables": variables}
-        )
-        data = await response.json()
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            async with self.limiter.acquire():
+                response = await session.post(
+                    ANILIST_API_ENDPOINT, json={"query": query, "variables": variables}
+                )
+                if response.status != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                    data = await response.json()
+                    break
+                wait = retry_after(response.headers.get("Retry-After"))
+                response.release()
+            # The turn is given back while waiting, so other guilds' requests are not held up.
+            log.warning("AniList rate limit hit, retrying in %.1f seconds.", wait)
+            await asyncio.sleep(wait)
         if data.get("errors"):
             raise AnilistAPIError(
                 data.get("errors")[0]["message"],
@@ -57,6 +109,57 @@ class AniListClient:
             )
         return data
 
+    async def paginate(
+        self,
+        query: str,
+        key: str,
+        per_page: int = 50,
+        concurrency: int = 3,
+        max_pages: Optional[int] = None,
+        **variables: Union[str, Any],
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yields every page of a `Page` query in page order.
+
+        The first page is fetched on its own to read `pageInfo`, the following pages are then
+        fetched concurrently in a sliding window of at most `concurrency` requests. The query
+        must select `pageInfo { lastPage hasNextPage }` and accept the `$page` and `$perPage`
+        variables. Pending requests are cancelled as soon as the consumer stops iterating.
+        """
+
+        async def fetch(page: int) -> Dict[str, Any]:
+            data = await self._request(query=query, page=page, perPage=per_page, **variables)
+            return data.get("data")["Page"]
+
+        first = await fetch(1)
+        yield first.get(key) or []
+        page_info = first.get("pageInfo") or {}
+        if not first.get(key) or not page_info.get("hasNextPage"):
+            return
+
+        last_page = page_info.get("lastPage") or 1
+        if max_pages is not None:
+            last_page = min(last_page, max_pages)
+
+        pending: Dict[int, asyncio.Task] = {}
+        next_page, has_next = 2, True
+        try:
+            while has_next and (max_pages is None or next_page <= max_pages):
+                # `lastPage` is only an estimate, keep going one page at a time past it if needed.
+                window_end = max(last_page, next_page)
+                for page in range(next_page, min(next_page + concurrency, window_end + 1)):
+                    if page not in pending:
+                        pending[page] = asyncio.ensure_future(fetch(page))
+                result = await pending.pop(next_page)
+                items = result.get(key) or []
+                if items:
+                    yield items
+                has_next = bool(items) and (result.get("pageInfo") or {}).get("hasNextPage", False)
+                next_page += 1
+        finally:
+            for task in pending.values():
+                task.cancel()
+
     async def media(self, **variables: Union[str, Any]) -> Union[List[Dict[str, Any]], None]:
         """Gets a list of media entries based on the given search variables."""
         data = await self._request(query=Query.media(), **variables)
@@ -64,6 +167,16 @@ class AniListClient:
             return data.get("data")["Page"]["media"]
         return None
 
+    async def media_by_ids(
+        self, ids: List[int], **filters: Union[str, Any]
+    ) -> Union[List[Dict[str, Any]], None]:
+        """Gets the media entries with the given ids in the same order as the ids."""
+        data = await self.media(id_in=ids, page=1, perPage=len(ids), **filters)
+        if data:
+            entries = {entry.get("id"): entry for entry in data}
+            return [entries[id_] for id_ in ids if id_ in entries] or None
+        return None
+
     async def character(self, **variables: Union[str, Any]) -> Union[List[Dict[str, Any]], None]:
         """Gets a list of characters based on the given search variables."""
         data = await self._request(query=Query.character(), **variables)
@@ -106,6 +219,17 @@ class AniListClient:
             return data.get("data")["Page"]["users"][0]
         return None
 
+    async def user_favourites(
+        self, id_: int, section: str, page: int = 1, perPage: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Gets a single favourites section of a user, the other sections are not requested."""
+        sections = {name: name == section for name in USER_FAVOURITES_SECTIONS}
+        data = await self._request(
+            query=Query.user_favourites(), id=id_, page=page, perPage=perPage, **sections
+        )
+        favourites = (data.get("data")["User"] or {}).get("favourites") or {}
+        return (favourites.get(section) or {}).get("nodes") or []
+
     async def schedule(self, **variables: Union[str, Any]) -> Union[Dict[str, Any], None]:
         """Gets a airing schedule based on the given search variables."""
         data = await self._request(query=Query.schedule(), **variables)
@@ -120,15 +244,96 @@ class AniListClient:
             return data.get("data")["Page"]["media"]
         return None
 
+    async def relations(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """Gets the given media with their relations, fetching chunks of 50 ids concurrently."""
+        chunks = [ids[i : i + 50] for i in range(0, len(ids), 50)]
+        results = await asyncio.gather(
+            *(
+                self._request(query=Query.relations(), page=1, perPage=len(chunk), id_in=chunk)
+                for chunk in chunks
+            )
+        )
+        return [entry for data in results for entry in data.get("data")["Page"]["media"] or []]
+
+    async def media_list(self, user_id: int, type_: str, since: int = 0) -> List[Dict[str, Any]]:
+        """
+        Gets the list entries of a user updated after `since`.
+
+        Entries are requested most recently updated first, so an incremental sync stops at the
+        first page reaching back to entries it already has. A full sync fetches pages concurrently.
+        """
+        if not since:
+            entries = []
+            async for items in self.paginate(
+                Query.media_list(), "mediaList", userId=user_id, type=type_
+            ):
+                entries.extend(items)
+            return entries
+
+        entries, page = [], 1
+        while True:
+            data = await self._request(
+                query=Query.media_list(), page=page, perPage=50, userId=user_id, type=type_
+            )
+            result = data.get("data")["Page"]
+            items = result.get("mediaList") or []
+            # Entries changed within the same second as `since` may not have been seen yet.
+            fresh = [item for item in items if (item.get("updatedAt") or 0) >= since]
+            entries.extend(fresh)
+            if len(fresh) < len(items) or not (result.get("pageInfo") or {}).get("hasNextPage"):
+                return entries
+            page += 1
+
+    async def media_list_ids(self, user_id: int, type_: str) -> Set[int]:
+        """Gets the media ids of every entry of a user's list in a single request."""
+        data = await self._request(query=Query.media_list_ids(), userId=user_id, type=type_)
+        collection = data.get("data")["MediaListCollection"] or {}
+        return {
+            entry["mediaId"]
+            for list_ in collection.get("lists") or []
+            for entry in list_.get("entries") or []
+        }
+
+    async def season(self, **variables: Union[str, Any]) -> Union[List[Dict[str, Any]], None]:
+        """Gets every anime of a season sorted by popularity."""
+        media = []
+        async for page in self.paginate(Query.season(), "media", **variables):
+            media.extend(page)
+        return media or None
+
 
 class Query:
     @classmethod
     def media(cls) -> str:
         MEDIA_QUERY: str = """
-        query ($page: Int, $perPage: Int, $search: String, $type: MediaType) {
+        query (
+          $page: Int
+          $perPage: Int
+          $search: String
+          $type: MediaType
+          $id_in: [Int]
+          $seasonYear: Int
+          $season: MediaSeason
+          $format_in: [MediaFormat]
+          $status: MediaStatus
+          $startDate_greater: FuzzyDateInt
+          $startDate_lesser: FuzzyDateInt
+        ) {
           Page(page: $page, perPage: $perPage) {
-            media(search: $search, type: $type) {
+            media(
+              search: $search
+              type: $type
+              id_in: $id_in
+              seasonYear: $seasonYear
+              season: $season
+              format_in: $format_in
+              status: $status
+              startDate_greater: $startDate_greater
+              startDate_lesser: $startDate_lesser
+            ) {
+              id
               idMal
+              popularity
               title {
                 romaji
                 english
@@ -165,6 +370,10 @@ class Query:
               }
               synonyms
               genres
+              tags {
+                name
+                rank
+              }
               trailer {
                 id
                 site
@@ -177,6 +386,7 @@ class Query:
               isAdult
               nextAiringEpisode {
                 episode
+                airingAt
                 timeUntilAiring
               }
             }
@@ -191,6 +401,8 @@ class Query:
         query ($page: Int, $perPage: Int, $search: String) {
           Page(page: $page, perPage: $perPage) {
             characters(search: $search) {
+              id
+              favourites
               name {
                 full
                 native
@@ -285,12 +497,28 @@ class Query:
     @classmethod
     def genre(cls) -> str:
         GENRE_QUERY: str = """
-        query ($page: Int, $perPage: Int, $genre: String, $type: MediaType, $format_in: [MediaFormat]) {
+        query (
+          $page: Int
+          $perPage: Int
+          $genre: String
+          $type: MediaType
+          $format_in: [MediaFormat]
+          $sort: [MediaSort]
+          $isAdult: Boolean
+        ) {
           Page(page: $page, perPage: $perPage) {
             pageInfo {
               lastPage
+              hasNextPage
             }
-            media(genre: $genre, type: $type, format_in: $format_in) {
+            media(
+              genre: $genre
+              type: $type
+              format_in: $format_in
+              sort: $sort
+              isAdult: $isAdult
+            ) {
+              id
               idMal
               title {
                 romaji
@@ -351,12 +579,28 @@ class Query:
     @classmethod
     def tag(cls) -> str:
         TAG_QUERY: str = """
-        query ($page: Int, $perPage: Int, $tag: String, $type: MediaType, $format_in: [MediaFormat]) {
+        query (
+          $page: Int
+          $perPage: Int
+          $tag: String
+          $type: MediaType
+          $format_in: [MediaFormat]
+          $sort: [MediaSort]
+          $isAdult: Boolean
+        ) {
           Page(page: $page, perPage: $perPage) {
             pageInfo {
               lastPage
+              hasNextPage
             }
-            media(tag: $tag, type: $type, format_in: $format_in) {
+            media(
+              tag: $tag
+              type: $type
+              format_in: $format_in
+              sort: $sort
+              isAdult: $isAdult
+            ) {
+              id
               idMal
               title {
                 romaji
@@ -414,12 +658,56 @@ class Query:
         """
         return TAG_QUERY
 
+    @classmethod
+    def media_list(cls) -> str:
+        MEDIA_LIST_QUERY: str = """
+        query ($page: Int, $perPage: Int, $userId: Int, $type: MediaType) {
+          Page(page: $page, perPage: $perPage) {
+            pageInfo {
+              lastPage
+              hasNextPage
+            }
+            mediaList(userId: $userId, type: $type, sort: UPDATED_TIME_DESC) {
+              status
+              score(format: POINT_100)
+              progress
+              repeat
+              updatedAt
+              media {
+                id
+                episodes
+                chapters
+                duration
+                genres
+              }
+            }
+          }
+        }
+        """
+        return MEDIA_LIST_QUERY
+
+    @classmethod
+    def media_list_ids(cls) -> str:
+        MEDIA_LIST_IDS_QUERY: str = """
+        query ($userId: Int, $type: MediaType) {
+          MediaListCollection(userId: $userId, type: $type) {
+            lists {
+              entries {
+                mediaId
+              }
+            }
+          }
+        }
+        """
+        return MEDIA_LIST_IDS_QUERY
+
     @classmethod
     def user(cls) -> str:
         USER_QUERY: str = """
         query ($page: Int, $perPage: Int, $name: String) {
           Page(page: $page, perPage: $perPage) {
             users(name: $name) {
+              id
               name
               avatar {
                 large
@@ -441,69 +729,82 @@ class Query:
                   volumesRead
                 }
               }
-              favourites {
-                anime {
-                  nodes {
-                    id
-                    siteUrl
-                    title {
-                      romaji
-                      english
-                      native
-                      userPreferred
-                    }
+              siteUrl
+            }
+          }
+        }
+        """
+        return USER_QUERY
+
+    @classmethod
+    def user_favourites(cls) -> str:
+        USER_FAVOURITES_QUERY: str = """
+        query (
+          $id: Int
+          $page: Int
+          $perPage: Int
+          $anime: Boolean!
+          $manga: Boolean!
+          $characters: Boolean!
+          $staff: Boolean!
+          $studios: Boolean!
+        ) {
+          User(id: $id) {
+            favourites {
+              anime(page: $page, perPage: $perPage) @include(if: $anime) {
+                nodes {
+                  id
+                  siteUrl
+                  isAdult
+                  title {
+                    romaji
+                    english
                   }
                 }
-                manga {
-                  nodes {
-                    id
-                    siteUrl
-                    title {
-                      romaji
-                      english
-                      native
-                      userPreferred
-                    }
+              }
+              manga(page: $page, perPage: $perPage) @include(if: $manga) {
+                nodes {
+                  id
+                  siteUrl
+                  isAdult
+                  title {
+                    romaji
+                    english
                   }
                 }
-                characters {
-                  nodes {
-                    id
-                    siteUrl
-                    name {
-                      first
-                      last
-                      full
-                      native
-                    }
+              }
+              characters(page: $page, perPage: $perPage) @include(if: $characters) {
+                nodes {
+                  id
+                  siteUrl
+                  name {
+                    full
+                    native
                   }
                 }
-                staff {
-                  nodes {
-                    id
-                    siteUrl
-                    name {
-                      first
-                      last
-                      full
-                      native
-                    }
+              }
+              staff(page: $page, perPage: $perPage) @include(if: $staff) {
+                nodes {
+                  id
+                  siteUrl
+                  name {
+                    full
+                    native
                   }
                 }
-                studios {
-                  nodes {
-                    id
-                    siteUrl
-                    name
-                  }
+              }
+              studios(page: $page, perPage: $perPage) @include(if: $studios) {
+                nodes {
+                  id
+                  siteUrl
+                  name
                 }
               }
-              siteUrl
             }
           }
         }
         """
-        return USER_QUERY
+        return USER_FAVOURITES_QUERY
 
     @classmethod
     def schedule(cls) -> str:
@@ -549,7 +850,9 @@ class Query:
         query ($page: Int, $perPage: Int, $type: MediaType, $sort: [MediaSort]) {
           Page(page: $page, perPage: $perPage) {
             media(type: $type, sort: $sort) {
+              id
               idMal
+              popularity
               title {
                 romaji
                 english
@@ -586,6 +889,10 @@ class Query:
               }
               synonyms
               genres
+              tags {
+                name
+                rank
+              }
               trailer {
                 id
                 site
@@ -605,3 +912,125 @@ class Query:
         }
         """
         return TRENDING_QUERY
+
+    @classmethod
+    def season(cls) -> str:
+        SEASON_QUERY: str = """
+        query ($page: Int, $perPage: Int, $season: MediaSeason, $seasonYear: Int) {
+          Page(page: $page, perPage: $perPage) {
+            pageInfo {
+              lastPage
+              hasNextPage
+            }
+            media(season: $season, seasonYear: $seasonYear, type: ANIME, sort: POPULARITY_DESC) {
+              id
+              type
+              title {
+                romaji
+                english
+              }
+              synonyms
+              popularity
+              coverImage {
+                large
+              }
+              isAdult
+            }
+          }
+        }
+        """
+        return SEASON_QUERY
+
+    @classmethod
+    def catalog(cls) -> str:
+        CATALOG_QUERY: str = """
+        query ($page: Int, $perPage: Int, $type: MediaType, $sort: [MediaSort]) {
+          Page(page: $page, perPage: $perPage) {
+            pageInfo {
+              lastPage
+              hasNextPage
+            }
+            media(type: $type, sort: $sort) {
+              id
+              idMal
+              type
+              format
+              status
+              season
+              seasonYear
+              meanScore
+              popularity
+              isAdult
+              updatedAt
+              title {
+                romaji
+                english
+                native
+              }
+              synonyms
+              genres
+              tags {
+                name
+                rank
+              }
+              coverImage {
+                large
+                color
+              }
+              startDate {
+                year
+                month
+                day
+              }
+              endDate {
+                year
+                month
+                day
+              }
+              episodes
+              chapters
+              volumes
+              duration
+              source
+              siteUrl
+            }
+          }
+        }
+        """
+        return CATALOG_QUERY
+
+    @classmethod
+    def relations(cls) -> str:
+        RELATIONS_QUERY: str = """
+        query ($page: Int, $perPage: Int, $id_in: [Int]) {
+          Page(page: $page, perPage: $perPage) {
+            media(id_in: $id_in) {
+              id
+              type
+              format
+              episodes
+              isAdult
+              siteUrl
+              title {
+                romaji
+                english
+              }
+              startDate {
+                year
+                month
+                day
+              }
+              relations {
+                edges {
+                  relationType
+                  node {
+                    id
+                    type
+                  }
+                }
+              }
+            }
+          }
+        }
+        """
+        return RELATIONS_QUERY
@@ -1,12 +1,56 @@
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
 
 import aiohttp
 
 from ..utility import ANIMETHEMES_BASE_URL
+from .cache import TTLCache
+from .limiter import FairLimiter
+from .transport import HTTPTransport
 
 log = logging.getLogger("red.historian.anime")
 
+SEARCH_CACHE_TTL = 6 * 60 * 60
+
+SEARCH_INCLUDE = ("themes.entries.videos", "themes.song.artists", "images")
+
+# Sparse fieldsets of the attributes the theme embeds and the slug index read, relationships are
+# returned regardless.
+THEMES_FIELDS = {
+    "anime": ("name", "slug"),
+    "animetheme": ("slug",),
+    "animethemeentry": ("nsfw",),
+    "video": ("basename",),
+    "song": ("title",),
+    "artist": ("name",),
+    "image": ("link",),
+}
+
+# AnimeThemes numbers the first theme only if there is a second one, both spellings find it.
+SLUG_ALIASES = {"OP": "OP1", "OP1": "OP", "ED": "ED1", "ED1": "ED"}
+
+
+def normalize_slug(slug: str) -> str:
+    """Normalizes a theme slug like `op 2` to `OP2`."""
+    return "".join(slug.split()).upper()
+
+
+def index_themes(anime: Dict[str, Any]) -> Dict[str, Tuple[Dict[str, Any], Optional[str]]]:
+    """Maps the normalized slugs of the themes of an anime to the theme and its video basename."""
+    index = {}
+    for theme in anime.get("themes") or []:
+        entries = theme.get("entries") or []
+        videos = (entries[0].get("videos") or []) if entries else []
+        index.setdefault(
+            normalize_slug(theme.get("slug") or ""),
+            (theme, videos[0].get("basename") if videos else None),
+        )
+    for slug, alias in SLUG_ALIASES.items():
+        if slug in index:
+            index.setdefault(alias, index[slug])
+    return index
+
 
 class AnimeThemesException(Exception):
     """Base exception class for the AnimeThemes API wrapper."""
@@ -23,9 +67,17 @@ class AnimeThemesClient:
     """Asynchronous wrapper client for the AnimeThemes API."""
 
     def __init__(
-        self, session: Optional[aiohttp.ClientSession] = None, headers: Dict[str, Any] = None
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        headers: Dict[str, Any] = None,
+        limiter: Optional[FairLimiter] = None,
+        transport: Optional[HTTPTransport] = None,
     ) -> None:
         self.session = session
+        self.limiter = limiter or FairLimiter()
+        self.transport = transport
+        self._searches = TTLCache(SEARCH_CACHE_TTL, maxsize=256)
+        self._anime = TTLCache(SEARCH_CACHE_TTL, maxsize=256)
         if headers:
             self.headers = headers
         else:
@@ -44,6 +96,8 @@ class AnimeThemesClient:
 
     async def _session(self) -> aiohttp.ClientSession:
         """Gets an aiohttp session by creating it if it does not already exist or the previous session is closed."""
+        if self.transport is not None:
+            return await self.transport.session()
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
         return self.session
@@ -51,8 +105,9 @@ class AnimeThemesClient:
     async def _request(self, url: str) -> Dict[str, Any]:
         """Makes a request to the AnimeThemes API."""
         session = await self._session()
-        response = await session.get(url=url, headers=self.headers)
-        data = await response.json()
+        async with self.limiter.acquire():
+            response = await session.get(url=url, headers=self.headers)
+            data = await response.json()
         if data.get("errors"):
             raise AnimeThemesAPIError(
                 data.get("errors")[0]["detail"], data.get("errors")[0]["status"]
@@ -65,13 +120,112 @@ class AnimeThemesClient:
         request_url = f"{ANIMETHEMES_BASE_URL}/{endpoint}{parameters}"
         return request_url
 
-    async def search(self, query: str, limit: Optional[int] = 5) -> Dict[str, Any]:
-        """Returns relevant resources by search criteria."""
+    @staticmethod
+    def _parameters(include: Iterable[str], fields: Optional[Dict[str, Sequence[str]]]) -> str:
+        """Returns the include and sparse fieldset parameters of a request."""
+        parameters = ""
+        for type_, names in sorted((fields or {}).items()):
+            parameters += f"&fields[{type_}]={'%2C'.join(names)}"
+        return f"{parameters}&include={'%2C'.join(include)}"
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 5,
+        include: Iterable[str] = SEARCH_INCLUDE,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns relevant resources by search criteria.
+
+        Only the given relationships are included and, if `fields` is given, only the listed
+        attributes of each resource type are returned.
+
+        Results are cached per normalized query and parameters, a cached search with at least as
+        many results answers smaller limits as well. Every anime carries a `theme_slugs` index of
+        its themes.
+        """
+        parameters = "&fields[search]=anime" + self._parameters(include, fields)
+        key = (" ".join(query.lower().split()), parameters)
+        cached = self._searches.get(key)
+        if cached is not None and cached[0] >= limit:
+            data = cached[1]
+            search = data.get("search") or {}
+            return {**data, "search": {**search, "anime": (search.get("anime") or [])[:limit]}}
+        data = await self._search(query, limit, parameters)
+        for anime in (data.get("search") or {}).get("anime") or []:
+            anime["theme_slugs"] = index_themes(anime)
+        self._searches.set(key, (limit, data))
+        return data
+
+    async def _search(self, query: str, limit: int, parameters: str) -> Dict[str, Any]:
+        """Requests the search endpoint."""
         q = "%20".join(query.split())
-        parameters = (
-            f"?q={q}&limit={limit}&fields[search]=anime&include="
-            f"themes.entries.videos%2Cthemes.song.artists%2Cimages"
-        )
-        url = await self.get_url("search", parameters)
+        url = await self.get_url("search", f"?q={q}&limit={limit}{parameters}")
         data = await self._request(url=url)
         return data
+
+    async def anime(
+        self,
+        slug: str,
+        include: Iterable[str] = SEARCH_INCLUDE,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Returns the anime with the given slug, with a `theme_slugs` index of its themes, or None if
+        there is none.
+        """
+        parameters = self._parameters(include, fields)
+        key = (slug, parameters)
+        anime = self._anime.get(key)
+        if anime is None:
+            url = await self.get_url(f"anime/{slug}", f"?{parameters[1:]}")
+            anime = (await self._request(url=url)).get("anime")
+            if not anime:
+                return None
+            anime["theme_slugs"] = index_themes(anime)
+            self._anime.set(key, anime)
+        return anime
+
+    async def anime_by_resource(
+        self,
+        site: str,
+        external_id: int,
+        include: Iterable[str] = SEARCH_INCLUDE,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Returns the anime linked to the given id on an external site like `AniList` or
+        `MyAnimeList`, with a `theme_slugs` index of its themes.
+        """
+        parameters = self._parameters(include, fields)
+        url = await self.get_url(
+            "anime",
+            f"?filter[has]=resources&filter[site]={site}&filter[external_id]={external_id}"
+            f"{parameters}",
+        )
+        data = await self._request(url=url)
+        if not data.get("anime"):
+            return None
+        anime = data["anime"][0]
+        anime["theme_slugs"] = index_themes(anime)
+        if anime.get("slug"):
+            self._anime.set((anime["slug"], parameters), anime)
+        return anime
+
+    async def anime_pages(
+        self,
+        include: Iterable[str] = SEARCH_INCLUDE,
+        fields: Optional[Dict[str, Sequence[str]]] = None,
+        updated_since: Optional[str] = None,
+        size: int = 100,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Walks the anime listing page by page, only the anime updated since a time if given."""
+        parameters = f"?page[size]={size}&sort=id{self._parameters(include, fields)}"
+        if updated_since:
+            parameters += f"&filter[updated_at-gte]={quote(updated_since)}"
+        url = await self.get_url("anime", parameters)
+        while url:
+            data = await self._request(url=url)
+            yield data.get("anime") or []
+            url = (data.get("links") or {}).get("next")
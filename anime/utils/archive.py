@@ -0,0 +1,162 @@
+import html
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Set, Tuple
+
+from ..utility import clean_html
+from .trigram import normalize_title
+
+log = logging.getLogger("red.historian.anime")
+
+# The archive keeps the newest items within this budget, the log is compacted at 125 %.
+NEWS_ARCHIVE_LIMIT = 5000
+
+NEWS_DESCRIPTION_LENGTH = 300
+
+# A term found in the title counts this much more than one found in the description.
+TITLE_WEIGHT = 2.0
+
+# A week old item ranks like a new item matching half a word less.
+RECENCY_HALF_LIFE = 7 * 24 * 60 * 60
+
+
+def news_tokens(text: str) -> Set[str]:
+    """Returns the distinct words of a text."""
+    return set(normalize_title(text).split())
+
+
+class NewsArchive:
+    """
+    Append-only archive of every news item seen, with an inverted index over its words.
+
+    Items are appended to a JSON lines file and indexed in memory, each word maps to the ascending
+    positions of the items containing it in a compact integer array. Once the file holds a quarter
+    more items than the budget, it is rewritten with the newest items only and the index rebuilt.
+    """
+
+    def __init__(self, path: Path, limit: int = NEWS_ARCHIVE_LIMIT) -> None:
+        self.path = path
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._items: List[Dict[str, Any]] = []
+        self._titles: List[FrozenSet[str]] = []
+        self._guids: Set[str] = set()
+        self._index: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def load(self) -> None:
+        """Reads the archive file and builds the index."""
+        items = []
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash while appending.
+                        continue
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._rebuild(items)
+        if len(items) > self.limit * 1.25:
+            self.compact()
+
+    def _rebuild(self, items: List[Dict[str, Any]]) -> None:
+        self._items = []
+        self._titles = []
+        self._guids = set()
+        self._index = {}
+        for item in items:
+            self._append(item)
+
+    def _append(self, item: Dict[str, Any]) -> None:
+        position = len(self._items)
+        self._items.append(item)
+        title = frozenset(news_tokens(item["title"]))
+        self._titles.append(title)
+        self._guids.add(item["link"])
+        for word in title | news_tokens(f'{item["description"]} {item["category"]}'):
+            postings = self._index.get(word)
+            if postings is None:
+                postings = self._index[word] = array("I")
+            postings.append(position)
+
+    def add(self, feed: str, items: List[Dict[str, Any]]) -> int:
+        """Archives the items of a feed that are not archived yet, oldest first."""
+        new = []
+        with self._lock:
+            for item in reversed(items):
+                link = item.get("link")
+                if not link or link in self._guids:
+                    continue
+                description = html.unescape(clean_html(item.get("description") or "")).strip()
+                entry = {
+                    "feed": feed,
+                    "link": link,
+                    "title": item.get("title") or "",
+                    "description": description[:NEWS_DESCRIPTION_LENGTH],
+                    "category": item.get("category") or "",
+                    "timestamp": item.get("timestamp") or time.time(),
+                }
+                self._append(entry)
+                new.append(entry)
+            if new:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.writelines(
+                        json.dumps(entry, separators=(",", ":")) + "\n" for entry in new
+                    )
+        if len(self._items) > self.limit * 1.25:
+            self.compact()
+        return len(new)
+
+    def compact(self) -> None:
+        """Keeps only the newest items within the budget, rewriting the file atomically."""
+        with self._lock:
+            items = sorted(self._items, key=lambda item: item["timestamp"])[-self.limit :]
+            temporary = self.path.with_name(self.path.name + ".tmp")
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(item, separators=(",", ":")) + "\n" for item in items)
+            os.replace(temporary, self.path)
+            self._rebuild(items)
+        log.debug("Compacted the news archive to %d items.", len(items))
+
+    def search(self, query: str, limit: int = 30) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Returns the items matching the most words of the query, best and most recent first.
+
+        Every matched word counts one, or `TITLE_WEIGHT` if it is in the title, and recency adds
+        up to one more that halves every `RECENCY_HALF_LIFE` of age.
+        """
+        words = news_tokens(query)
+        if not words:
+            return []
+        now = time.time()
+        with self._lock:
+            matched: Dict[int, List[str]] = {}
+            for word in words:
+                for position in self._index.get(word, ()):
+                    matched.setdefault(position, []).append(word)
+            if not matched:
+                return []
+            # Items matching fewer words than the best match are only kept to fill the results.
+            best = max(len(found) for found in matched.values())
+            results = []
+            for position, found in matched.items():
+                if len(found) < best - 1:
+                    continue
+                item = self._items[position]
+                title = self._titles[position]
+                score = sum(TITLE_WEIGHT if word in title else 1.0 for word in found)
+                age = max(now - item["timestamp"], 0)
+                results.append((item, score + math.pow(0.5, age / RECENCY_HALF_LIFE)))
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:limit]
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .anilist import AniListClient, Query
+
+log = logging.getLogger("red.historian.anime")
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    id_mal INTEGER,
+    type TEXT NOT NULL,
+    format TEXT,
+    status TEXT,
+    season TEXT,
+    season_year INTEGER,
+    mean_score INTEGER,
+    popularity INTEGER NOT NULL DEFAULT 0,
+    is_adult INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL DEFAULT 0,
+    romaji TEXT,
+    english TEXT,
+    native TEXT,
+    synonyms TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_id_mal ON media (id_mal);
+CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5 (
+    romaji, english, native, synonyms,
+    content='media', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS media_ai AFTER INSERT ON media BEGIN
+    INSERT INTO media_fts (rowid, romaji, english, native, synonyms)
+    VALUES (new.id, new.romaji, new.english, new.native, new.synonyms);
+END;
+CREATE TRIGGER IF NOT EXISTS media_ad AFTER DELETE ON media BEGIN
+    INSERT INTO media_fts (media_fts, rowid, romaji, english, native, synonyms)
+    VALUES ('delete', old.id, old.romaji, old.english, old.native, old.synonyms);
+END;
+CREATE TRIGGER IF NOT EXISTS media_au AFTER UPDATE ON media BEGIN
+    INSERT INTO media_fts (media_fts, rowid, romaji, english, native, synonyms)
+    VALUES ('delete', old.id, old.romaji, old.english, old.native, old.synonyms);
+    INSERT INTO media_fts (rowid, romaji, english, native, synonyms)
+    VALUES (new.id, new.romaji, new.english, new.native, new.synonyms);
+END;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+CATALOG_COLUMNS = (
+    "id",
+    "id_mal",
+    "type",
+    "format",
+    "status",
+    "season",
+    "season_year",
+    "mean_score",
+    "popularity",
+    "is_adult",
+    "updated_at",
+    "romaji",
+    "english",
+    "native",
+    "synonyms",
+    "data",
+)
+
+# AniList media arguments the catalog can filter on, and the columns they map to.
+CATALOG_FILTERS = {
+    "seasonYear": "season_year",
+    "season": "season",
+    "format_in": "format",
+    "status": "status",
+}
+
+FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Fields `Finder.get_media_embed` reads that the catalog does not store.
+MEDIA_DEFAULTS: Dict[str, Any] = {
+    "description": None,
+    "bannerImage": None,
+    "studios": {"nodes": []},
+    "trailer": None,
+    "externalLinks": None,
+    "nextAiringEpisode": None,
+    "startDate": {"year": None, "month": None, "day": None},
+    "endDate": {"year": None, "month": None, "day": None},
+}
+
+# Marks the entries read from the catalog, their details are loaded from AniList when shown.
+STORED_ENTRY = "_catalog"
+
+
+class AniListCatalog:
+    """Local SQLite copy of the AniList media catalog with a full text index over the titles."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(CATALOG_SCHEMA)
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    @staticmethod
+    def _match_expression(query: str) -> Optional[str]:
+        """Turns free text into an FTS5 expression where every token has to prefix-match."""
+        tokens = FTS_TOKEN.findall(query.lower())
+        if not tokens:
+            return None
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def search(self, query: str, type_: str, limit: int = 15, **filters: Any) -> List[int]:
+        """Returns the ids of the best matching media, best match first."""
+        expression = self._match_expression(query)
+        if expression is None:
+            return []
+        clauses = ["media_fts MATCH ?", "media.type = ?"]
+        parameters: List[Any] = [expression, type_]
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                clauses.append(f"media.{column} IN ({', '.join('?' * len(value))})")
+                parameters.extend(value)
+            else:
+                clauses.append(f"media.{column} = ?")
+                parameters.append(value)
+        sql = (
+            "SELECT media.id FROM media_fts JOIN media ON media.id = media_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} "
+            "ORDER BY bm25(media_fts, 10.0, 10.0, 5.0, 2.0), media.popularity DESC LIMIT ?"
+        )
+        parameters.append(limit)
+        try:
+            with self._lock:
+                rows = self._connection.execute(sql, parameters).fetchall()
+        except sqlite3.OperationalError as e:
+            log.debug("Catalog search for %r failed: %s", query, e)
+            return []
+        return [row[0] for row in rows]
+
+    def media(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Returns the stored media entries in the same order as the given ids."""
+        ids = list(ids)
+        if not ids:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, data FROM media WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+        entries = {
+            row["id"]: {**MEDIA_DEFAULTS, **json.loads(row["data"]), STORED_ENTRY: True}
+            for row in rows
+        }
+        return [entries[id_] for id_ in ids if id_ in entries]
+
+    def index_entries(self, after: int = 0, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Returns the stored media with an id above `after`, in id order, reduced to the fields the
+        title, suggestion and similarity indexes read.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT id, type, format, popularity, is_adult, romaji, english, native, "
+                "json_extract(data, '$.synonyms') AS synonyms, "
+                "json_extract(data, '$.genres') AS genres, "
+                "json_extract(data, '$.tags') AS tags, "
+                "json_extract(data, '$.siteUrl') AS site_url "
+                "FROM media WHERE id > ? ORDER BY id LIMIT ?",
+                (after, limit),
+            )
+            rows = cursor.fetchmany(limit)
+        return [
+            {
+                "id": row["id"],
+                "type": row["type"],
+                "format": row["format"],
+                "popularity": row["popularity"],
+                "isAdult": bool(row["is_adult"]),
+                "title": {
+                    "romaji": row["romaji"],
+                    "english": row["english"],
+                    "native": row["native"],
+                },
+                "synonyms": json.loads(row["synonyms"] or "[]"),
+                "genres": json.loads(row["genres"] or "[]"),
+                "tags": json.loads(row["tags"] or "[]"),
+                "siteUrl": row["site_url"],
+            }
+            for row in rows
+        ]
+
+    def upsert(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Inserts or replaces the given AniList media entries."""
+        rows = [
+            (
+                entry["id"],
+                entry.get("idMal"),
+                entry.get("type"),
+                entry.get("format"),
+                entry.get("status"),
+                entry.get("season"),
+                entry.get("seasonYear"),
+                entry.get("meanScore"),
+                entry.get("popularity") or 0,
+                int(bool(entry.get("isAdult"))),
+                entry.get("updatedAt") or 0,
+                (entry.get("title") or {}).get("romaji"),
+                (entry.get("title") or {}).get("english"),
+                (entry.get("title") or {}).get("native"),
+                " | ".join(entry.get("synonyms") or []),
+                json.dumps(entry, separators=(",", ":")),
+            )
+            for entry in entries
+        ]
+        with self._lock, self._connection:
+            # A real upsert, `INSERT OR REPLACE` would skip the delete trigger of the index.
+            self._connection.executemany(
+                f"INSERT INTO media VALUES ({', '.join('?' * len(CATALOG_COLUMNS))}) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                f"{', '.join(f'{column} = excluded.{column}' for column in CATALOG_COLUMNS[1:])}",
+                rows,
+            )
+        return len(rows)
+
+    async def sync(
+        self,
+        client: AniListClient,
+        type_: str,
+        callback: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ) -> int:
+        """
+        Synchronizes the catalog of the given media type with AniList.
+
+        The first run walks the whole catalog, later runs walk the most recently updated media and
+        stop at the first entry that has not changed since the previous run.
+        """
+        loop = asyncio.get_running_loop()
+        meta_key = f"synced_at:{type_}"
+        synced_at = int(self._get_meta(meta_key) or 0)
+        started_at = int(time.time())
+        count = 0
+        pages = client.paginate(
+            Query.catalog(),
+            "media",
+            concurrency=2,
+            type=type_,
+            sort="UPDATED_AT_DESC" if synced_at else "ID",
+        )
+        try:
+            async for page in pages:
+                changed = [
+                    entry
+                    for entry in page
+                    if not synced_at or (entry.get("updatedAt") or 0) > synced_at
+                ]
+                if changed:
+                    count += await loop.run_in_executor(None, self.upsert, changed)
+                    if callback is not None:
+                        callback(changed)
+                if synced_at and len(changed) < len(page):
+                    break
+        finally:
+            await pages.aclose()
+        self._set_meta(meta_key, str(started_at))
+        log.info("Synchronized %s %s entries of the AniList catalog.", count, type_.lower())
+        return count
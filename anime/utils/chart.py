@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from PIL import Image, ImageDraw, ImageFont
+
+log = logging.getLogger("red.historian.anime")
+
+THUMBNAIL_SIZE = (115, 163)
+CAPTION_HEIGHT = 28
+CHART_COLUMNS = 10
+CHART_BACKGROUND = (43, 45, 49)
+CHART_FOREGROUND = (220, 221, 222)
+
+
+def make_thumbnail(data: bytes, path: str, size: Tuple[int, int] = THUMBNAIL_SIZE) -> str:
+    """Downscales a cover image and writes it to the given path. Runs in a worker process."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail(size, Image.LANCZOS)
+        tmp = f"{path}.tmp"
+        image.save(tmp, format="JPEG", quality=90)
+    os.replace(tmp, path)
+    return path
+
+
+def _caption(draw: ImageDraw.ImageDraw, font: Any, text: str, width: int) -> str:
+    """Shortens a title until it fits below its cover."""
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        # The bitmap fallback font can only draw latin-1.
+        text = text.encode("latin-1", "replace").decode("latin-1")
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "...", font=font) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def render_chart(
+    covers: Sequence[Optional[str]], titles: Sequence[str], path: str, heading: str
+) -> str:
+    """Composites the cover thumbnails into a single grid image. Runs in a worker process."""
+    width, height = THUMBNAIL_SIZE
+    cell_height = height + CAPTION_HEIGHT
+    columns = min(CHART_COLUMNS, max(len(covers), 1))
+    rows = (len(covers) + columns - 1) // columns
+    header = 40
+
+    chart = Image.new("RGB", (columns * width, header + rows * cell_height), CHART_BACKGROUND)
+    draw = ImageDraw.Draw(chart)
+    font = ImageFont.load_default()
+    heading = _caption(draw, font, heading, chart.width - 16)
+    draw.text((8, 12), heading, fill=CHART_FOREGROUND, font=font)
+
+    for index, (cover, title) in enumerate(zip(covers, titles)):
+        x = (index % columns) * width
+        y = header + (index // columns) * cell_height
+        if cover is not None:
+            try:
+                with Image.open(cover) as thumbnail:
+                    offset = ((width - thumbnail.width) // 2, (height - thumbnail.height) // 2)
+                    chart.paste(thumbnail, (x + offset[0], y + offset[1]))
+            except OSError:
+                log.warning("Skipping unreadable cover thumbnail %s", cover)
+        caption = _caption(draw, font, title or "", width - 6)
+        draw.text((x + 3, y + height + 8), caption, fill=CHART_FOREGROUND, font=font)
+
+    tmp = f"{path}.tmp"
+    chart.save(tmp, format="JPEG", quality=85, optimize=True)
+    os.replace(tmp, path)
+    return path
+
+
+class CoverCache:
+    """Size-bounded disk cache of downscaled cover thumbnails and rendered charts."""
+
+    def __init__(
+        self, path: Path, max_bytes: int = 64 * 1024 * 1024, concurrency: int = 8
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def file(self, key: str, suffix: str = ".jpg") -> Path:
+        """Returns the cache file path for the given key."""
+        return self.path / f"{hashlib.sha1(key.encode()).hexdigest()}{suffix}"
+
+    def get(self, key: str, suffix: str = ".jpg") -> Optional[Path]:
+        """Returns the cached file for the given key and marks it as recently used."""
+        file = self.file(key, suffix)
+        if file.exists():
+            os.utime(file)
+            return file
+        return None
+
+    async def _thumbnail(
+        self, session: aiohttp.ClientSession, executor: Executor, url: str
+    ) -> Optional[str]:
+        """Downloads a single cover and downscales it once."""
+        cached = self.get(url)
+        if cached is not None:
+            return str(cached)
+        async with self._semaphore:
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        return None
+                    data = await response.read()
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    executor, make_thumbnail, data, str(self.file(url)), THUMBNAIL_SIZE
+                )
+            except Exception as e:
+                log.warning("Could not cache the cover %s: %s", url, e)
+                return None
+
+    async def thumbnails(
+        self, session: aiohttp.ClientSession, executor: Executor, urls: Sequence[Optional[str]]
+    ) -> List[Optional[str]]:
+        """Returns the thumbnail paths for the given covers, downloading missing ones."""
+
+        async def resolve(url: Optional[str]) -> Optional[str]:
+            return await self._thumbnail(session, executor, url) if url else None
+
+        paths = await asyncio.gather(*(resolve(url) for url in urls))
+        self.evict()
+        return list(paths)
+
+    def evict(self) -> None:
+        """Removes the least recently used files until the cache fits its size budget."""
+        files = []
+        total = 0
+        for file in self.path.iterdir():
+            if file.suffix == ".tmp":
+                continue
+            stat = file.stat()
+            files.append((stat.st_mtime, stat.st_size, file))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, file in sorted(files):
+            try:
+                file.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def chart_key(season: str, year: int, media: Sequence[Dict[str, Any]]) -> str:
+    """Returns a key that changes whenever the listed media or their covers change."""
+    digest = hashlib.sha1(f"{season}:{year}".encode())
+    for entry in media:
+        cover = (entry.get("coverImage") or {}).get("large")
+        digest.update(f'|{entry.get("id")}:{cover}'.encode())
+    return digest.hexdigest()
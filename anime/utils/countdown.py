@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiohttp
+import discord
+
+log = logging.getLogger("red.historian.anime")
+
+# The further away an episode airs, the coarser its countdown and the rarer its edits.
+COUNTDOWN_STEPS = (
+    (2 * 24 * 60 * 60, 60 * 60),
+    (6 * 60 * 60, 15 * 60),
+    (60 * 60, 5 * 60),
+    (0, 60),
+)
+
+# Edits of all countdowns together, well below the global limit of the Discord API.
+EDITS_PER_SECOND = 2.0
+
+# Edits are made just after the value changes, so the rounding already shows the new value.
+CHANGE_MARGIN = 1.0
+
+
+def countdown_step(remaining: float) -> int:
+    """Returns the granularity in seconds of a countdown with the given remaining time."""
+    for limit, step in COUNTDOWN_STEPS:
+        if remaining >= limit:
+            return step
+    return COUNTDOWN_STEPS[-1][1]
+
+
+def format_countdown(remaining: float) -> str:
+    """Formats the remaining time rounded up to the granularity of the countdown."""
+    if remaining <= 0:
+        return ""
+    step = countdown_step(remaining)
+    rounded = math.ceil(remaining / step) * step
+    days, rest = divmod(rounded, 24 * 60 * 60)
+    hours, rest = divmod(rest, 60 * 60)
+    minutes = rest // 60
+    units = ((days, "d"), (hours, "h"), (minutes, "m"))
+    return " ".join(f"{value}{unit}" for value, unit in units if value)
+
+
+def next_change(remaining: float) -> float:
+    """Returns in how many seconds the formatted countdown changes."""
+    step = countdown_step(remaining)
+    return remaining - (math.ceil(remaining / step) - 1) * step
+
+
+class Countdown:
+    """A message showing the time until an episode airs."""
+
+    __slots__ = ("message", "airing_at", "render", "label")
+
+    def __init__(
+        self,
+        message: discord.Message,
+        airing_at: int,
+        render: Callable[[float], Awaitable[discord.Embed]],
+        label: str,
+    ) -> None:
+        self.message = message
+        self.airing_at = airing_at
+        self.render = render
+        self.label = label
+
+
+class CountdownTicker:
+    """
+    Keeps every countdown message current from a single task.
+
+    Countdowns wait in a heap ordered by the time their formatted value next changes, so a
+    message is only edited when what it shows changes, at most once per step of its granularity.
+    Edits are spread out to at most `edits_per_second` however many countdowns are active, a late
+    edit simply shows the value current at the time it is made.
+    """
+
+    def __init__(self, edits_per_second: float = EDITS_PER_SECOND) -> None:
+        self.edits_per_second = edits_per_second
+        self._heap: List[Tuple[float, int, Countdown]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(
+        self,
+        message: discord.Message,
+        airing_at: int,
+        render: Callable[[float], Awaitable[discord.Embed]],
+    ) -> None:
+        """Starts updating a countdown message that was sent with `render(remaining)`."""
+        remaining = airing_at - time.time()
+        countdown = Countdown(message, airing_at, render, format_countdown(remaining))
+        self._schedule(countdown, time.time() + next_change(remaining) + CHANGE_MARGIN)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        """Stops updating every countdown."""
+        if self._task is not None:
+            self._task.cancel()
+        self._heap.clear()
+
+    def _schedule(self, countdown: Countdown, due: float) -> None:
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, next(self._counter), countdown))
+
+    async def _run(self) -> None:
+        while self._heap:
+            due = self._heap[0][0]
+            delay = due - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, countdown = heapq.heappop(self._heap)
+            try:
+                edited = await self._update(countdown)
+            except Exception as e:
+                # A countdown that cannot be updated is dropped, the others keep going.
+                log.exception("Dropped the countdown %s.", countdown.message.id, exc_info=e)
+                continue
+            if edited:
+                await asyncio.sleep(1 / self.edits_per_second)
+
+    async def _update(self, countdown: Countdown) -> bool:
+        """Edits a countdown if its value changed and schedules it again, returns if it edited."""
+        remaining = countdown.airing_at - time.time()
+        label = format_countdown(remaining)
+        edited = False
+        if label != countdown.label:
+            try:
+                await countdown.message.edit(embed=await countdown.render(remaining))
+            except (discord.NotFound, discord.Forbidden):
+                return True
+            except (
+                discord.HTTPException,
+                aiohttp.ClientError,
+                OSError,
+                asyncio.TimeoutError,
+            ) as e:
+                # Edited again at the next change of the countdown.
+                log.warning("Could not update the countdown %s: %s", countdown.message.id, e)
+            else:
+                countdown.label = label
+            edited = True
+        if remaining > 0:
+            self._schedule(countdown, time.time() + next_change(remaining) + CHANGE_MARGIN)
+        elif countdown.label:
+            # The final edit failed, try again a minute later.
+            self._schedule(countdown, time.time() + 60)
+        return edited
@@ -1,13 +1,25 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 
 import aiohttp
-from bs4 import BeautifulSoup
 
 from ..utility import CRUNCHYROLL_NEWS_FEED_ENDPOINT
+from .feeds import FEED_ITEMS, FeedState, parse_date, parse_items
+from .limiter import FairLimiter
+from .transport import HTTPTransport
 
 log = logging.getLogger("red.historian.anime")
 
+# The fields of a news entry and the item elements they are read from.
+FEED_FIELDS = {
+    "title": "title",
+    "author": "author",
+    "description": "description",
+    "date": "pubDate",
+    "link": "guid",
+}
+
 
 class CrunchyrollException(Exception):
     """Base exception class for the Crunchyroll RSS feed parser."""
@@ -23,8 +35,16 @@ class CrunchyrollFeedError(CrunchyrollException):
 class CrunchyrollClient:
     """Asynchronous parser client for the Crunchyroll RSS feed."""
 
-    def __init__(self, session: Optional[aiohttp.ClientSession] = None) -> None:
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        limiter: Optional[FairLimiter] = None,
+        transport: Optional[HTTPTransport] = None,
+    ) -> None:
         self.session = session
+        self.limiter = limiter or FairLimiter()
+        self.transport = transport
+        self.feed = FeedState()
 
     async def __aenter__(self):
         return self
@@ -39,45 +59,71 @@ class CrunchyrollClient:
 
     async def _session(self) -> aiohttp.ClientSession:
         """Gets an aiohttp session by creating it if it does not already exist or the previous session is closed."""
+        if self.transport is not None:
+            return await self.transport.session()
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
         return self.session
 
-    async def _request(self, url: str) -> str:
-        """Makes a request to the Crunchyroll RSS feed."""
+    async def _request(self, url: str) -> Tuple[Optional[str], Mapping[str, str]]:
+        """
+        Makes a conditional request to the Crunchyroll RSS feed.
+
+        Returns the body and the headers, the body is None if the feed is unchanged.
+        """
         session = await self._session()
-        response = await session.get(url)
-        if response.status == 200:
-            data = await response.text()
-        else:
-            raise CrunchyrollFeedError(response.status)
-        return data
+        async with self.limiter.acquire():
+            response = await session.get(url, headers=self.feed.headers())
+            if response.status == 304:
+                data = None
+            elif response.status == 200:
+                data = await response.text()
+            else:
+                raise CrunchyrollFeedError(response.status)
+        return data, response.headers
 
     @staticmethod
     async def _parse_feed(text: str, count: int) -> Union[List[Dict[str, Any]], None]:
-        """Parses the feed and creates a dictionary for each entry."""
-        soup = BeautifulSoup(text, "html.parser")
-        items = soup.find_all("item")
-        if items:
-            data = []
-            for item in items:
-                if len(data) >= count:
-                    break
-                feed = {
-                    "title": item.find("title").text,
-                    "author": item.find("author").text,
-                    "description": item.find("description").text,
-                    "date": item.find("pubdate").text,
-                    "link": item.find("guid").text,
-                }
-                data.append(feed)
-            return data
-        return None
+        """Parses the first entries of the feed in a thread, off the event loop."""
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, parse_items, text, FEED_FIELDS, count)
+        return data or None
+
+    async def refresh(self) -> bool:
+        """Polls the feed, parsing it only if it changed, and returns whether it did."""
+        text, headers = await self._request(CRUNCHYROLL_NEWS_FEED_ENDPOINT)
+        if text is None:
+            self.feed.checked()
+            return False
+        if not self.feed.changed(text):
+            self.feed.update(headers, text, self.feed.items)
+            return False
+        # The validators are only kept with parsed items, a feed that could not be parsed would
+        # otherwise be answered with `304 Not Modified` and never be parsed again.
+        try:
+            items = await self._parse_feed(text=text, count=FEED_ITEMS)
+        except Exception:
+            self.feed.reset()
+            raise
+        if not items:
+            self.feed.reset()
+            return False
+        for item in items:
+            item["timestamp"] = parse_date(item.get("date"))
+        self.feed.update(headers, text, items)
+        return True
 
     async def news(self, count: int) -> Union[List[Dict[str, Any]], None]:
-        """Gets a list of anime news."""
-        text = await self._request(CRUNCHYROLL_NEWS_FEED_ENDPOINT)
-        data = await self._parse_feed(text=text, count=count)
+        """Gets a list of anime news, kept in memory and polled again only once it is stale."""
+        async with self.feed.lock:
+            if self.feed.stale:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    if not self.feed.items:
+                        raise
+                    log.warning("Could not poll the Crunchyroll feed, serving older news: %s", e)
+        data = self.feed.items[:count]
         if data:
             return data
         return None
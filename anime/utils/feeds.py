@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+from html.entities import html5
+from typing import Any, Dict, List, Mapping, Optional
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+log = logging.getLogger("red.historian.anime")
+
+# The background poller checks every feed this often, the news commands then read the memory.
+FEED_POLL_INTERVAL = 5 * 60
+
+# Items older than this many polls are served only if the feed cannot be reached.
+FEED_STALE_AFTER = 2 * FEED_POLL_INTERVAL
+
+# The news commands show 15 items and a poll sees far fewer new ones, the rest is never parsed.
+FEED_ITEMS = 30
+
+FEED_CHUNK_SIZE = 16 * 1024
+
+HTML_ENTITY = re.compile(r"&([A-Za-z][A-Za-z0-9]*);")
+
+XML_ENTITIES = frozenset(("amp", "lt", "gt", "quot", "apos"))
+
+
+def _replace_entity(match: re.Match) -> str:
+    character = html5.get(f"{match.group(1)};")
+    if character is None or match.group(1) in XML_ENTITIES:
+        return match.group(0)
+    return escape(character, {'"': "&quot;"})
+
+
+def parse_items(
+    text: str, fields: Mapping[str, str], count: int
+) -> List[Dict[str, Optional[str]]]:
+    """
+    Returns the text of the given child elements of the first `count` items of an RSS feed.
+
+    The feed is fed in chunks to a pull parser that stops once enough items were read, and every
+    item is cleared after its fields were taken, so no tree of the whole feed is ever built. HTML
+    entities, which XML does not define, are replaced by their characters, and the items
+    read before a malformed part of the feed are still returned.
+    """
+    parser = ElementTree.XMLPullParser(("end",))
+    items: List[Dict[str, Optional[str]]] = []
+    start = 0
+    try:
+        while start < len(text):
+            end = start + FEED_CHUNK_SIZE
+            # Chunks do not end within an entity, the longest HTML entity has 32 characters.
+            cut = text.rfind("&", end - 32, end)
+            if cut > start and ";" not in text[cut:end]:
+                end = cut
+            parser.feed(HTML_ENTITY.sub(_replace_entity, text[start:end]))
+            start = end
+            for _, element in parser.read_events():
+                if element.tag != "item":
+                    continue
+                items.append({name: element.findtext(tag) for name, tag in fields.items()})
+                element.clear()
+                if len(items) >= count:
+                    return items
+    except ElementTree.ParseError as e:
+        log.warning("Stopped parsing a news feed after %d items: %s", len(items), e)
+    return items
+
+
+def parse_date(date: Optional[str]) -> float:
+    """Returns the timestamp of an RFC 822 `pubDate`, 0 if it cannot be parsed."""
+    try:
+        return parsedate_to_datetime(date).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return 0.0
+
+
+class FeedState:
+    """
+    Validators and parsed items of a feed polled with conditional requests.
+
+    The `ETag` and `Last-Modified` of the previous response are sent back, so an unchanged feed
+    costs a `304 Not Modified`, and a changed response whose body hashes the same is not parsed.
+    """
+
+    def __init__(self) -> None:
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.digest: Optional[bytes] = None
+        self.items: List[Dict[str, Any]] = []
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def stale(self) -> bool:
+        """Returns whether the feed was not checked recently."""
+        return time.monotonic() - self.checked_at >= FEED_STALE_AFTER
+
+    def headers(self) -> Dict[str, str]:
+        """Returns the conditional request headers of the next poll."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def checked(self) -> None:
+        """Marks the feed as checked and unchanged."""
+        self.checked_at = time.monotonic()
+
+    def changed(self, text: str) -> bool:
+        """Returns whether a body differs from the one the items were parsed from."""
+        return hashlib.sha256(text.encode()).digest() != self.digest
+
+    def update(self, headers: Mapping[str, str], text: str, items: List[Dict[str, Any]]) -> None:
+        """Remembers the items of a response, newest first, with its validators and digest."""
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+        self.digest = hashlib.sha256(text.encode()).digest()
+        # Feeds do not guarantee their item order, the timeline merge and seen items rely on it.
+        self.items = sorted(items, key=lambda item: item.get("timestamp") or 0, reverse=True)
+        self.checked()
+
+    def reset(self) -> None:
+        """Forgets the validators and digest, so the next poll downloads and parses the feed."""
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
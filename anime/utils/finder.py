@@ -8,12 +8,22 @@ import discord
 from discord import Embed
 from discord.ext.commands import Context
 
-from ..utility import (AniListSearchType, clean_html, format_anime_status,
-                       format_date, format_description, format_manga_status,
-                       format_media_type, is_adult)
+from ..utility import (AniListSearchType, LazyEmbedMenu, clean_html,
+                       format_anime_status, format_date, format_description,
+                       format_manga_status, format_media_type,
+                       get_char_staff_name, get_media_stats, get_media_title,
+                       is_adult)
+from .catalog import CATALOG_FILTERS, STORED_ENTRY
+from .countdown import format_countdown
+from .trigram import media_titles
 
 log = logging.getLogger("red.historian.anime")
 
+FUZZY_SIMILARITY = 0.6
+
+# Filtered searches are narrowed by AniList, so far fewer results are requested.
+FILTERED_PER_PAGE = 5
+
 
 class Finder:
     """Finder Module"""
@@ -66,6 +76,41 @@ class Finder:
 
         return embed
 
+    @staticmethod
+    async def get_countdown_embed(data: Dict[str, Any], remaining: float) -> Embed:
+        """Returns the countdown embed."""
+        episode = data.get("nextAiringEpisode") or {}
+        airing_at = episode.get("airingAt")
+        if remaining > 0:
+            description = (
+                f'Episode **{episode.get("episode")}** airing in '
+                f"**{format_countdown(remaining)}**."
+            )
+        else:
+            description = f'Episode **{episode.get("episode")}** has aired.'
+        if airing_at:
+            description += f"\n<t:{airing_at}:F>"
+
+        embed = discord.Embed(
+            title=get_media_title(data.get("title")),
+            colour=int("0x" + data.get("coverImage")["color"].replace("#", ""), 0)
+            if (data.get("coverImage") or {}).get("color")
+            else discord.Color.random(),
+            description=description,
+        )
+
+        if data.get("siteUrl"):
+            embed.url = data.get("siteUrl")
+
+        embed.set_author(name="Countdown")
+
+        if (data.get("coverImage") or {}).get("large"):
+            embed.set_thumbnail(url=data.get("coverImage")["large"])
+
+        embed.set_footer(text=f"Provided by https://anilist.co/")
+
+        return embed
+
     @staticmethod
     async def get_last_embed(data: Dict[str, Any], page: int, pages: int) -> Embed:
         """Returns the `last` embed."""
@@ -153,6 +198,19 @@ class Finder:
 
         return embed
 
+    @staticmethod
+    async def get_media_themes_embed(media: Dict[str, Any], anime: Dict[str, Any]) -> Embed:
+        """Returns the themes embed of an anime, titled and linked like its AniList entry."""
+        embed = await Finder.get_themes_embed(anime, 1, 1)
+
+        title = media.get("title") or {}
+        embed.title = title.get("english") or title.get("romaji") or anime.get("name")
+        embed.url = media.get("siteUrl")
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ and https://animethemes.moe/")
+
+        return embed
+
     @staticmethod
     async def get_theme_embed(anime: Dict[str, Any], data: Dict[str, Any]) -> Embed:
         """Returns the theme embed."""
@@ -233,24 +291,360 @@ class Finder:
 
         return embed
 
+    @staticmethod
+    async def get_watch_order_embed(
+        data: List[Dict[str, Any]], title: str, start: int, page: int, pages: int
+    ) -> Embed:
+        """Returns the watch order embed."""
+        lines = []
+        for position, entry in enumerate(data, start=start):
+            year = (entry.get("startDate") or {}).get("year") or "TBA"
+            type_ = format_media_type(entry.get("format")) if entry.get("format") else "N/A"
+            lines.append(
+                f'**{position}.** [{get_media_title(entry.get("title"))}]({entry.get("siteUrl")}) '
+                f"• {type_} • {year}"
+            )
+
+        embed = discord.Embed(
+            title=title, color=discord.Color.random(), description="\n".join(lines)
+        )
+
+        embed.set_author(name="Watch Order")
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_browse_embed(
+        data: List[Dict[str, Any]], title: str, start: int, page: int, pages: int
+    ) -> Embed:
+        """Returns the genre and tag browser embed."""
+        lines = []
+        for position, entry in enumerate(data, start=start):
+            year = (entry.get("startDate") or {}).get("year") or "TBA"
+            type_ = format_media_type(entry.get("format")) if entry.get("format") else "N/A"
+            score = entry.get("meanScore") or "N/A"
+            lines.append(
+                f'**{position}.** [{get_media_title(entry.get("title"))}]({entry.get("siteUrl")}) '
+                f"• {type_} • {year} • Score: {score}"
+            )
+
+        embed = discord.Embed(
+            title=title, color=discord.Color.random(), description="\n".join(lines)
+        )
+
+        embed.set_author(name="Browse")
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_news_search_embed(
+        data: List[Dict[str, Any]], title: str, start: int, page: int, pages: int
+    ) -> Embed:
+        """Returns the news archive search embed."""
+        lines = []
+        for position, entry in enumerate(data, start=start):
+            source = "Anime News Network" if entry.get("feed") == "ann" else "Crunchyroll"
+            date = datetime.datetime.utcfromtimestamp(entry.get("timestamp")).strftime("%Y-%m-%d")
+            lines.append(
+                f'**{position}.** [{entry.get("title")}]({entry.get("link")}) '
+                f"• {source} • {date}"
+            )
+
+        embed = discord.Embed(
+            title=title, color=discord.Color.random(), description="\n".join(lines)
+        )
+
+        embed.set_author(name="News Archive")
+
+        embed.set_footer(text=f"Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_similar_embed(
+        data: List[Dict[str, Any]], title: str, start: int, page: int, pages: int
+    ) -> Embed:
+        """Returns the similar anime embed."""
+        lines = []
+        for position, (entry, similarity) in enumerate(data, start=start):
+            type_ = format_media_type(entry.get("format")) if entry.get("format") else "N/A"
+            lines.append(
+                f'**{position}.** [{get_media_title(entry.get("title"))}]({entry.get("siteUrl")}) '
+                f"• {type_} • {similarity:.0%} match"
+            )
+
+        embed = discord.Embed(
+            title=title, color=discord.Color.random(), description="\n".join(lines)
+        )
+
+        embed.set_author(name="Similar Anime")
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_media_card_embed(data: Dict[str, Any]) -> Embed:
+        """Returns the compact media embed answering an inline mention."""
+        embed = discord.Embed(
+            title=get_media_title(data.get("title")),
+            description=format_description(data.get("description"), 200)
+            if data.get("description")
+            else None,
+            colour=int("0x" + data.get("coverImage")["color"].replace("#", ""), 0)
+            if (data.get("coverImage") or {}).get("color")
+            else discord.Color.random(),
+        )
+
+        if data.get("siteUrl"):
+            embed.url = data.get("siteUrl")
+
+        embed.set_author(
+            name=get_media_stats(
+                data.get("format"), data.get("type"), data.get("status"), data.get("meanScore")
+            )
+        )
+
+        if (data.get("coverImage") or {}).get("large"):
+            embed.set_thumbnail(url=data.get("coverImage")["large"])
+
+        embed.set_footer(text=f"Provided by https://anilist.co/")
+
+        return embed
+
+    @staticmethod
+    async def get_user_embed(data: Dict[str, Any], page: int, pages: int) -> Embed:
+        """Returns the user profile embed."""
+        embed = discord.Embed(
+            title=data.get("name"),
+            color=discord.Color.random(),
+            description=format_description(data.get("about"), 1000)
+            if data.get("about")
+            else None,
+        )
+
+        embed.set_author(name="User")
+
+        if data.get("siteUrl"):
+            embed.url = data.get("siteUrl")
+
+        if (data.get("avatar") or {}).get("large"):
+            embed.set_thumbnail(url=data.get("avatar")["large"])
+
+        if data.get("bannerImage"):
+            embed.set_image(url=data.get("bannerImage"))
+
+        statistics = data.get("statistics") or {}
+        anime = statistics.get("anime") or {}
+        if anime.get("count"):
+            embed.add_field(
+                name="Anime",
+                value=f'Entries: **{anime.get("count")}**\n'
+                f'Mean Score: **{anime.get("meanScore") or "N/A"}**\n'
+                f'Episodes: **{anime.get("episodesWatched") or 0}**\n'
+                f'Days Watched: **{round((anime.get("minutesWatched") or 0) / 1440, 1)}**',
+                inline=True,
+            )
+        manga = statistics.get("manga") or {}
+        if manga.get("count"):
+            embed.add_field(
+                name="Manga",
+                value=f'Entries: **{manga.get("count")}**\n'
+                f'Mean Score: **{manga.get("meanScore") or "N/A"}**\n'
+                f'Chapters: **{manga.get("chaptersRead") or 0}**\n'
+                f'Volumes: **{manga.get("volumesRead") or 0}**',
+                inline=True,
+            )
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_user_favourites_embed(
+        user: Dict[str, Any], section: str, data: List[Dict[str, Any]], page: int, pages: int
+    ) -> Embed:
+        """Returns the user favourites embed."""
+        lines = []
+        for position, entry in enumerate(data, start=1):
+            if section in ("anime", "manga"):
+                name = get_media_title(entry.get("title"))
+            elif section in ("characters", "staff"):
+                name = get_char_staff_name(entry.get("name"))
+            else:
+                name = entry.get("name")
+            lines.append(f'**{position}.** [{name}]({entry.get("siteUrl")})')
+
+        embed = discord.Embed(
+            title=user.get("name"),
+            color=discord.Color.random(),
+            description="\n".join(lines) if lines else "No favourites.",
+        )
+
+        embed.set_author(name=f"Favourite {section.capitalize()}")
+
+        if user.get("siteUrl"):
+            embed.url = user.get("siteUrl")
+
+        if (user.get("avatar") or {}).get("medium"):
+            embed.set_thumbnail(url=user.get("avatar")["medium"])
+
+        embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
+
+    @staticmethod
+    async def get_list_stats_embed(name: str, type_: str, stats: Dict[str, Any]) -> Embed:
+        """Returns the list statistics embed."""
+        embed = discord.Embed(
+            title=name,
+            color=discord.Color.random(),
+            url=f"https://anilist.co/user/{name}/{type_.lower()}list",
+        )
+
+        embed.set_author(name=f"{type_.capitalize()} Statistics")
+
+        statuses = stats.get("statuses")
+        embed.add_field(
+            name="Entries",
+            value="\n".join(
+                f"{status.capitalize()}: **{count}**" for status, count in statuses.items()
+            )
+            if statuses
+            else "N/A",
+            inline=True,
+        )
+
+        summary = [f'Total: **{stats.get("total")}**']
+        if stats.get("mean_score") is not None:
+            summary.append(f'Mean Score: **{stats.get("mean_score"):.1f}**')
+        if stats.get("completion_rate") is not None:
+            summary.append(f'Completion Rate: **{stats.get("completion_rate"):.0%}**')
+        if type_ == "ANIME":
+            summary.append(f'Episodes: **{stats.get("consumed")}**')
+            summary.append(f'Days Watched: **{round(stats.get("minutes") / 1440, 1)}**')
+        else:
+            summary.append(f'Chapters: **{stats.get("consumed")}**')
+        embed.add_field(name="Overview", value="\n".join(summary), inline=True)
+
+        histogram = stats.get("score_histogram") or []
+        if any(histogram):
+            highest = max(histogram)
+            bars = [
+                f"`{bucket * 10 + 1:>3}-{bucket * 10 + 10:<3}` "
+                f'{"█" * round(count / highest * 15)} {count}'
+                for bucket, count in enumerate(histogram)
+                if count
+            ]
+            embed.add_field(name="Scores", value="\n".join(bars), inline=False)
+
+        if stats.get("genres"):
+            embed.add_field(
+                name="Genres",
+                value=" | ".join(f"{genre}: **{count}**" for genre, count in stats["genres"][:10]),
+                inline=False,
+            )
+
+        embed.set_footer(text=f"Provided by https://anilist.co/")
+
+        return embed
+
+    async def anilist_local_media(
+        self, search: str, type_: str, limit: int = 15, **filters: Any
+    ) -> Union[List[Dict[str, Any]], None]:
+        """Returns the stored media matching the search from the local catalog."""
+        if self.catalog is None or any(name not in CATALOG_FILTERS for name in filters):
+            return None
+        columns = {CATALOG_FILTERS[name]: value for name, value in filters.items()}
+        ids = self.catalog.search(search, type_, limit=limit, **columns)
+        return self.catalog.media(ids) or None
+
+    async def anilist_media_details(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Completes a media entry of the local catalog with the details only AniList returns."""
+        if not entry.pop(STORED_ENTRY, False):
+            return entry
+        try:
+            data = await self.anilist.media_by_ids([entry["id"]])
+        except Exception as e:
+            log.warning("Could not load the details of the catalog entry %s: %s", entry["id"], e)
+            entry[STORED_ENTRY] = True
+            return entry
+        if data:
+            # Updated in place, so a page opened again or a cached entry is not loaded twice.
+            entry.update(data[0])
+        return entry
+
+    async def anilist_indexed_media(
+        self, ids: List[int], **filters: Any
+    ) -> Union[List[Dict[str, Any]], None]:
+        """Returns the media of title index matches, from the local catalog if it can be used."""
+        if not ids:
+            return None
+        if self.catalog is not None and not filters:
+            data = self.catalog.media(ids)
+            if data:
+                return data
+        return await self.anilist.media_by_ids(ids, **filters)
+
+    async def anilist_find_media(
+        self, search: str, type_: str, limit: int = 15, **filters: Any
+    ) -> Union[List[Dict[str, Any]], None]:
+        """
+        Returns the media matching the search.
+
+        A misspelled title the title index is sure about is answered without searching AniList,
+        else AniList is searched and the closest known titles are only taken if it has no result.
+        """
+        data = await self.anilist_local_media(search, type_, limit, **filters)
+        misspelled = self.titles.misspelling(search, type_) if data is None else None
+        if misspelled is not None:
+            data = await self.anilist_indexed_media([misspelled], **filters)
+        if data is None:
+            data = await self.anilist.media(
+                search=search, page=1, perPage=limit, type=type_, **filters
+            )
+        # A weaker match is only taken for a typo when AniList has no result, a close title like a
+        # sequel's would otherwise shadow entries that are not indexed yet.
+        if data is None and misspelled is None:
+            matches = self.titles.search(search, type_, limit=5, threshold=FUZZY_SIMILARITY)
+            data = await self.anilist_indexed_media([id_ for id_, _ in matches], **filters)
+        self.remember_media(data)
+        return data[:limit] if data else None
+
+    def remember_media(self, entries: Optional[List[Dict[str, Any]]]) -> None:
+        """Adds media entries returned by AniList to the local title indexes."""
+        for entry in entries or []:
+            self.titles.add_media(entry)
+            self.suggestions.add(entry.get("type"), media_titles(entry), entry.get("popularity"))
+            self.similar.add_media(entry)
+
+    def remember_characters(self, entries: Optional[List[Dict[str, Any]]]) -> None:
+        """Adds characters returned by AniList to the local name suggestions."""
+        for entry in entries or []:
+            name = entry.get("name") or {}
+            names = [name.get("full"), name.get("native"), *(name.get("alternative") or [])]
+            self.suggestions.add("CHARACTER", names, entry.get("favourites"))
+
     async def anilist_search(
-        self, ctx: Context, search: str, type_: str
-    ) -> Union[List[Embed], None]:
-        """Returns a list of Discord embeds with the retrieved anilist data about the searched entry."""
-        embeds = []
+        self, ctx: Context, search: str, type_: str, filters: Optional[Dict[str, Any]] = None
+    ) -> Union[LazyEmbedMenu, None]:
+        """Returns a menu source with the embeds of the retrieved anilist data about the searched entry."""
         data = None
+        filters = filters or {}
+        limit = FILTERED_PER_PAGE if filters else 15
 
         try:
             if type_ == AniListSearchType.Anime:
-                data = await self.anilist.media(
-                    search=search, page=1, perPage=15, type=type_.upper()
-                )
+                data = await self.anilist_find_media(search, type_.upper(), limit, **filters)
             elif type_ == AniListSearchType.Manga:
-                data = await self.anilist.media(
-                    search=search, page=1, perPage=15, type=type_.upper()
-                )
+                data = await self.anilist_find_media(search, type_.upper(), limit, **filters)
             elif type_ == AniListSearchType.Character:
                 data = await self.anilist.character(search=search, page=1, perPage=15)
+                self.remember_characters(data)
             elif type_ == AniListSearchType.Staff:
                 data = await self.anilist.staff(search=search, page=1, perPage=15)
             elif type_ == AniListSearchType.Studio:
@@ -263,54 +657,58 @@ class Finder:
                 title=f"An error occurred while searching for the {type_.lower()} `{search}`. Try again.",
                 color=discord.Color.red(),
             )
-            embeds.append(embed)
 
-            return embeds
+            async def error(embed: Embed, page: int, pages: int) -> Embed:
+                return embed
+
+            return LazyEmbedMenu([embed], error)
 
         if data is not None:
-            for page, entry in enumerate(data):
 
-                embed = None
+            async def build(entry: Dict[str, Any], page: int, pages: int) -> Embed:
+                return await self.get_search_embed(ctx, type_, entry, page, pages)
 
-                try:
-                    if type_ == AniListSearchType.Anime:
-                        embed = await self.get_media_embed(entry, page + 1, len(data))
-                    elif type_ == AniListSearchType.Manga:
-                        embed = await self.get_media_embed(entry, page + 1, len(data))
-                    elif type_ == AniListSearchType.Character:
-                        embed = await self.get_character_embed(entry, page + 1, len(data))
-                    elif type_ == AniListSearchType.Staff:
-                        embed = await self.get_staff_embed(entry, page + 1, len(data))
-                    elif type_ == AniListSearchType.Studio:
-                        embed = await self.get_studio_embed(entry, page + 1, len(data))
-
-                    if not isinstance(ctx.channel, discord.channel.DMChannel):
-                        if is_adult(entry) and not ctx.channel.is_nsfw():
-                            embed = discord.Embed(
-                                title="Error",
-                                color=discord.Color.red(),
-                                description=f"Adult content. No NSFW channel.",
-                            )
-                            embed.set_footer(
-                                text=f"Provided by https://anilist.co/ • Page {page + 1}/{len(data)}"
-                            )
-
-                except Exception as e:
-                    log.exception(e)
+            return LazyEmbedMenu(data, build)
+        return None
+
+    async def get_search_embed(
+        self, ctx: Context, type_: str, entry: Dict[str, Any], page: int, pages: int
+    ) -> Embed:
+        """Returns the embed of a search result, built when its page is opened."""
+        try:
+            if type_ == AniListSearchType.Anime:
+                entry = await self.anilist_media_details(entry)
+                embed = await self.get_media_embed(entry, page, pages)
+            elif type_ == AniListSearchType.Manga:
+                entry = await self.anilist_media_details(entry)
+                embed = await self.get_media_embed(entry, page, pages)
+            elif type_ == AniListSearchType.Character:
+                embed = await self.get_character_embed(entry, page, pages)
+            elif type_ == AniListSearchType.Staff:
+                embed = await self.get_staff_embed(entry, page, pages)
+            elif type_ == AniListSearchType.Studio:
+                embed = await self.get_studio_embed(entry, page, pages)
 
+            if not isinstance(ctx.channel, discord.channel.DMChannel):
+                if is_adult(entry) and not ctx.channel.is_nsfw():
                     embed = discord.Embed(
                         title="Error",
                         color=discord.Color.red(),
-                        description=f"An error occurred while loading the embed for the {type_.lower()}.",
-                    )
-                    embed.set_footer(
-                        text=f"Provided by https://anilist.co/ • Page {page + 1}/{len(data)}"
+                        description=f"Adult content. No NSFW channel.",
                     )
+                    embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
 
-                embeds.append(embed)
+        except Exception as e:
+            log.exception(e)
 
-            return embeds
-        return None
+            embed = discord.Embed(
+                title="Error",
+                color=discord.Color.red(),
+                description=f"An error occurred while loading the embed for the {type_.lower()}.",
+            )
+            embed.set_footer(text=f"Provided by https://anilist.co/ • Page {page}/{pages}")
+
+        return embed
 
     async def anilist_random(
         self, ctx: Context, search: str, type_: str, format_in: List[str]
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Hashable, Optional
+
+# The guild the current command runs in, set before every command of the cog.
+current_guild: "ContextVar[Optional[int]]" = ContextVar("anime_current_guild", default=None)
+
+
+class FairLimiter:
+    """
+    Fair-queuing limiter for the outbound API calls of every guild.
+
+    At most `concurrency` calls are in flight overall and at most `per_guild` for each guild, and
+    a guild may start at most `rate` calls every `per` seconds. Waiting calls are queued per guild
+    and free capacity is handed out round robin, so a guild with a long queue is served one call at
+    a time like every other guild instead of in front of them. Calls made outside of a guild, like
+    background synchronization, share one queue that is not limited per window.
+    """
+
+    def __init__(
+        self, concurrency: int = 8, per_guild: int = 2, rate: int = 30, per: float = 60.0
+    ) -> None:
+        self.concurrency = concurrency
+        self.per_guild = per_guild
+        self.rate = rate
+        self.per = per
+        self._queues: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._active: Dict[Hashable, int] = {}
+        self._started: Dict[Hashable, Deque[float]] = {}
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def acquire(self, key: Optional[Hashable] = None) -> AsyncIterator[None]:
+        """Waits for the turn of a call of the given guild, the current guild by default."""
+        if key is None:
+            key = current_guild.get()
+        future = asyncio.get_event_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The turn was granted just as the call was cancelled.
+                self._release(key)
+            raise
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    def _release(self, key: Hashable) -> None:
+        self._in_flight -= 1
+        self._active[key] -= 1
+        if not self._active[key]:
+            del self._active[key]
+            if key not in self._queues:
+                # Forgets the window of a guild that is done once it has passed.
+                self._within_rate(key, time.monotonic())
+        self._dispatch()
+
+    def _within_rate(self, key: Hashable, now: float) -> bool:
+        """Returns whether a guild may start another call in the current window."""
+        if key is None:
+            return True
+        started = self._started.get(key)
+        if started is None:
+            return True
+        while started and now - started[0] >= self.per:
+            started.popleft()
+        if not started:
+            del self._started[key]
+            return True
+        return len(started) < self.rate
+
+    def _dispatch(self) -> None:
+        """Grants free capacity to the waiting guilds, one call per guild per round."""
+        now = time.monotonic()
+        granted = True
+        while granted and self._in_flight < self.concurrency:
+            granted = False
+            for key in list(self._queues):
+                queue = self._queues[key]
+                while queue and queue[0].cancelled():
+                    queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                    continue
+                if self._active.get(key, 0) >= self.per_guild or not self._within_rate(key, now):
+                    continue
+                queue.popleft().set_result(None)
+                self._in_flight += 1
+                self._active[key] = self._active.get(key, 0) + 1
+                if key is not None:
+                    self._started.setdefault(key, deque()).append(now)
+                # The guild goes to the back of the line for the next round.
+                self._queues.move_to_end(key)
+                if not queue:
+                    del self._queues[key]
+                granted = True
+                if self._in_flight >= self.concurrency:
+                    return
+        self._schedule_window(now)
+
+    def _schedule_window(self, now: float) -> None:
+        """Dispatches again when the window of a guild that is waiting on its rate opens."""
+        if self._timer is not None or self._in_flight >= self.concurrency:
+            return
+        opens = [
+            self._started[key][0] + self.per
+            for key in self._queues
+            if key in self._started
+            and len(self._started[key]) >= self.rate
+            and self._active.get(key, 0) < self.per_guild
+        ]
+        if opens:
+            self._timer = asyncio.get_event_loop().call_later(
+                max(min(opens) - now, 0), self._on_window
+            )
+
+    def _on_window(self) -> None:
+        self._timer = None
+        self._dispatch()
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .anilist import AniListClient
+
+log = logging.getLogger("red.historian.anime")
+
+LIST_STATUSES = ("CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED", "REPEATING")
+
+GENRES = (
+    "Action",
+    "Adventure",
+    "Comedy",
+    "Drama",
+    "Ecchi",
+    "Fantasy",
+    "Hentai",
+    "Horror",
+    "Mahou Shoujo",
+    "Mecha",
+    "Music",
+    "Mystery",
+    "Psychological",
+    "Romance",
+    "Sci-Fi",
+    "Slice of Life",
+    "Sports",
+    "Supernatural",
+    "Thriller",
+)
+
+GENRE_BITS = {genre: bit for bit, genre in enumerate(GENRES)}
+
+# One array per column, `length` holds the episodes of an anime or the chapters of a manga.
+LIST_COLUMNS = {
+    "media_id": np.int32,
+    "status": np.int8,
+    "score": np.int8,
+    "progress": np.int32,
+    "repeat": np.int16,
+    "length": np.int32,
+    "duration": np.int16,
+    "genres": np.int32,
+    "updated_at": np.int64,
+}
+
+# Changes to the media of an entry, like its episode count, do not touch the entry's `updatedAt`,
+# so the whole list is fetched again weekly.
+FULL_SYNC_INTERVAL = 7 * 24 * 60 * 60
+
+LIST_SYNC_COOLDOWN = 60
+
+
+def entry_row(entry: Dict[str, Any]) -> Tuple[int, ...]:
+    """Returns the column values of an AniList media list entry."""
+    media = entry.get("media") or {}
+    genres = 0
+    for genre in media.get("genres") or []:
+        if genre in GENRE_BITS:
+            genres |= 1 << GENRE_BITS[genre]
+    status = entry.get("status")
+    return (
+        media["id"],
+        LIST_STATUSES.index(status) if status in LIST_STATUSES else -1,
+        entry.get("score") or 0,
+        entry.get("progress") or 0,
+        entry.get("repeat") or 0,
+        media.get("episodes") or media.get("chapters") or 0,
+        media.get("duration") or 0,
+        genres,
+        entry.get("updatedAt") or 0,
+    )
+
+
+class MediaList:
+    """The anime or manga list of a user stored as column arrays instead of a dict per entry."""
+
+    def __init__(
+        self,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+        synced_at: float = 0.0,
+        full_synced_at: float = 0.0,
+    ) -> None:
+        self.columns = columns or {
+            name: np.zeros(0, dtype=dtype) for name, dtype in LIST_COLUMNS.items()
+        }
+        self.synced_at = synced_at
+        self.full_synced_at = full_synced_at
+
+    def __len__(self) -> int:
+        return len(self.columns["media_id"])
+
+    @property
+    def updated_at(self) -> int:
+        """Returns the time of the most recent change to the list."""
+        return int(self.columns["updated_at"].max()) if len(self) else 0
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "MediaList":
+        """Creates a list from AniList entries, the first of duplicate entries is kept."""
+        rows = [entry_row(entry) for entry in entries]
+        if not rows:
+            return cls()
+        values = list(zip(*rows))
+        columns = {
+            name: np.array(values[index], dtype=dtype)
+            for index, (name, dtype) in enumerate(LIST_COLUMNS.items())
+        }
+        _, first = np.unique(columns["media_id"], return_index=True)
+        if len(first) < len(rows):
+            columns = {name: column[np.sort(first)] for name, column in columns.items()}
+        return cls(columns)
+
+    def retain(self, ids: Iterable[int]) -> int:
+        """Removes the entries whose media is not among the given ids, returns how many."""
+        keep = np.isin(self.columns["media_id"], np.fromiter(ids, dtype=np.int32))
+        self.columns = {name: column[keep] for name, column in self.columns.items()}
+        return int(len(keep) - keep.sum())
+
+    def merge(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Replaces or adds the given entries."""
+        update = MediaList.from_entries(entries).columns
+        keep = ~np.isin(self.columns["media_id"], update["media_id"])
+        self.columns = {
+            name: np.concatenate((column[keep], update[name]))
+            for name, column in self.columns.items()
+        }
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["MediaList"]:
+        """Reads a list saved with `save`."""
+        try:
+            with np.load(path) as data:
+                return cls(
+                    {name: data[name] for name in LIST_COLUMNS},
+                    float(data["synced_at"]),
+                    float(data["full_synced_at"]),
+                )
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+    def save(self, path: Path) -> None:
+        """Writes the list, replacing the previous file atomically."""
+        temporary = path.with_name(path.stem + ".tmp.npz")
+        np.savez(
+            temporary,
+            synced_at=np.float64(self.synced_at),
+            full_synced_at=np.float64(self.full_synced_at),
+            **self.columns,
+        )
+        os.replace(temporary, path)
+
+
+def list_statistics(media_list: MediaList) -> Dict[str, Any]:
+    """Computes the statistics of a list with vectorized operations over its columns."""
+    columns = media_list.columns
+    status = columns["status"].astype(np.intp)
+    counts = np.bincount(status[status >= 0], minlength=len(LIST_STATUSES))
+    started = status != LIST_STATUSES.index("PLANNING")
+    finished = counts[LIST_STATUSES.index("COMPLETED")] + counts[LIST_STATUSES.index("REPEATING")]
+
+    scores = columns["score"][columns["score"] > 0].astype(np.intp)
+    histogram = np.bincount((scores - 1) // 10, minlength=10)
+
+    bits = (columns["genres"][started, None] >> np.arange(len(GENRES), dtype=np.int32)) & 1
+    genres = bits.sum(axis=0)
+    order = np.argsort(genres)[::-1]
+
+    progress = columns["progress"].astype(np.int64)
+    consumed = progress + columns["repeat"] * columns["length"].astype(np.int64)
+    minutes = consumed * columns["duration"].astype(np.int64)
+
+    return {
+        "total": len(media_list),
+        "statuses": {name: int(count) for name, count in zip(LIST_STATUSES, counts) if count},
+        "mean_score": float(scores.mean()) if len(scores) else None,
+        "score_histogram": [int(count) for count in histogram],
+        "genres": [(GENRES[index], int(genres[index])) for index in order if genres[index]],
+        "completion_rate": float(finished / started.sum()) if started.any() else None,
+        "consumed": int(consumed.sum()),
+        "minutes": int(minutes.sum()),
+    }
+
+
+class ListStore:
+    """
+    Media lists of the linked AniList accounts, one `.npz` file of column arrays per list.
+
+    A sync only requests the entries updated since the newest stored entry and merges them, and
+    drops the entries whose ids are no longer on the list.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+
+    def file(self, user_id: int, type_: str) -> Path:
+        """Returns the path of a stored list."""
+        return self.path / f"{user_id}-{type_.lower()}.npz"
+
+    def remove(self, user_id: int) -> None:
+        """Deletes the stored lists of a user."""
+        for type_ in ("ANIME", "MANGA"):
+            try:
+                self.file(user_id, type_).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def sync(self, client: AniListClient, user_id: int, type_: str) -> MediaList:
+        """Brings the stored list of a user up to date and returns it."""
+        lock = self._locks.setdefault((user_id, type_), asyncio.Lock())
+        async with lock:
+            path = self.file(user_id, type_)
+            media_list = MediaList.load(path) or MediaList()
+            now = time.time()
+            if now - media_list.synced_at < LIST_SYNC_COOLDOWN:
+                return media_list
+
+            full = not len(media_list) or now - media_list.full_synced_at >= FULL_SYNC_INTERVAL
+            if not full:
+                # Removed entries are not revealed by `updatedAt`, the ids of the whole list are.
+                entries, ids = await asyncio.gather(
+                    client.media_list(user_id, type_, media_list.updated_at),
+                    client.media_list_ids(user_id, type_),
+                )
+                media_list.merge(entries)
+                removed = media_list.retain(ids)
+                log.debug(
+                    "Synced %d changed and %d removed %s list entries of %d",
+                    len(entries),
+                    removed,
+                    type_,
+                    user_id,
+                )
+                # Entries the list has but were not returned as changed were missed somehow.
+                full = len(media_list) != len(ids)
+
+            if full:
+                entries = await client.media_list(user_id, type_)
+                media_list = MediaList.from_entries(entries)
+                media_list.full_synced_at = now
+
+            media_list.synced_at = now
+            media_list.save(path)
+            return media_list
@@ -0,0 +1,68 @@
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from .cache import TTLCache
+from .trigram import normalize_title
+
+# `{{title}}` mentions an anime and `<<title>>` a manga.
+MENTION = re.compile(r"\{\{([^{}\n]{1,100})\}\}|<<([^<>\n]{1,100})>>")
+
+MAX_MENTIONS = 3
+
+
+def find_mentions(content: str) -> List[Tuple[str, str]]:
+    """Returns the `(type, title)` of the anime and manga mentioned in a message."""
+    # Nearly every message has neither marker, a substring check rejects those without the regex.
+    if "{{" not in content and "<<" not in content:
+        return []
+    mentions = []
+    for anime, manga in MENTION.findall(content):
+        title = (anime or manga).strip()
+        if title:
+            mentions.append(("ANIME" if anime else "MANGA", title))
+        if len(mentions) == MAX_MENTIONS:
+            break
+    return mentions
+
+
+class MentionThrottle:
+    """
+    Limits the cards answered per channel and drops mentions repeated within a window.
+
+    A channel may get `rate` cards every `per` seconds, and a title already answered in a channel
+    is not answered there again for `window` seconds.
+    """
+
+    def __init__(self, rate: int = 3, per: float = 30.0, window: float = 120.0) -> None:
+        self.rate = rate
+        self.per = per
+        self._channels: Dict[int, Deque[float]] = {}
+        self._recent = TTLCache(window, maxsize=4096)
+
+    def allow(self, channel_id: int, type_: str, title: str) -> bool:
+        """Returns whether a mention should be answered, counting it if so."""
+        key = (channel_id, type_, normalize_title(title))
+        if key in self._recent:
+            return False
+        now = time.monotonic()
+        sent = self._channels.setdefault(channel_id, deque())
+        while sent and now - sent[0] > self.per:
+            sent.popleft()
+        if len(sent) >= self.rate:
+            return False
+        sent.append(now)
+        self._recent.set(key, True)
+        if len(self._channels) > 4096:
+            self._prune(now)
+        return True
+
+    def _prune(self, now: float) -> None:
+        """Forgets the channels that have not been answered within the period."""
+        for channel_id in [
+            channel_id
+            for channel_id, sent in self._channels.items()
+            if not sent or now - sent[-1] > self.per
+        ]:
+            del self._channels[channel_id]
@@ -0,0 +1,75 @@
+import heapq
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Set, Tuple
+
+from .trigram import normalize_title
+
+# The news feeds channels can subscribe to and their names.
+NEWS_FEEDS = {"ann": "Anime News Network", "crunchyroll": "Crunchyroll"}
+
+# Well above the items of a feed, so an item never drops out of the set while still in the feed.
+NEWS_SEEN_LIMIT = 500
+
+# New items posted per feed and poll, older ones are only marked as seen.
+NEWS_PUSH_LIMIT = 5
+
+
+class SeenItems:
+    """Bounded set of the GUIDs of the news items already seen, the oldest are forgotten first."""
+
+    def __init__(self, guids: Iterable[str] = (), maxlen: int = NEWS_SEEN_LIMIT) -> None:
+        self._order: Deque[str] = deque(guids, maxlen=maxlen)
+        self._guids: Set[str] = set(self._order)
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._guids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, guid: str) -> None:
+        """Marks a GUID as seen."""
+        if guid in self._guids:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._guids.discard(self._order[0])
+        self._order.append(guid)
+        self._guids.add(guid)
+
+    def update(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Marks the items of a feed, newest first, as seen and returns the new ones oldest first."""
+        new = []
+        for item in reversed(items):
+            guid = item.get("link")
+            if guid and guid not in self._guids:
+                self.add(guid)
+                new.append(item)
+        return new
+
+
+def news_fingerprint(title: str) -> str:
+    """Returns the sorted words of a normalized title, the same for cross-posted stories."""
+    return " ".join(sorted(set(normalize_title(title).split())))
+
+
+def merge_news(feeds: Dict[str, List[Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Merges the items of several feeds, each newest first as `FeedState` keeps them, into one
+    `(feed, item)` timeline.
+
+    Stories posted by more than one feed are only kept at their most recent position.
+    """
+    streams = [[(feed, item) for item in items] for feed, items in feeds.items()]
+    merged = heapq.merge(*streams, key=lambda entry: entry[1].get("timestamp") or 0, reverse=True)
+    timeline = []
+    fingerprints = set()
+    for feed, item in merged:
+        fingerprint = news_fingerprint(item.get("title") or "")
+        if fingerprint and fingerprint in fingerprints:
+            continue
+        fingerprints.add(fingerprint)
+        timeline.append((feed, item))
+    return timeline
@@ -0,0 +1,82 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .trigram import normalize_title
+
+MAX_SCAN = 5000
+
+
+class PrefixIndex:
+    """
+    Sorted array of normalized titles answering "starts with" lookups ranked by popularity.
+
+    New titles are buffered and merged into the sorted array on the next lookup, so filling the
+    index from a synchronisation stays cheap.
+    """
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple[str, str, str]] = []
+        self._pending: List[Tuple[str, str, str]] = []
+        self._known: Set[Tuple[str, str]] = set()
+        self._popularity: Dict[Tuple[str, str], int] = {}
+        self._top: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending)
+
+    def add(self, type_: str, titles: Iterable[str], popularity: int = 0) -> None:
+        """Adds the titles of an entry, the first title is the one that is suggested."""
+        titles = [title for title in titles if title]
+        if not titles:
+            return
+        display = titles[0][:100]
+        key = (type_, display)
+        self._popularity[key] = max(popularity or 0, self._popularity.get(key, 0))
+        self._top.pop(type_, None)
+        if key in self._known:
+            return
+        self._known.add(key)
+        for title in titles:
+            normalized = normalize_title(title)
+            if normalized:
+                self._pending.append((normalized, type_, display))
+
+    def _merge(self) -> None:
+        """Merges the buffered titles into the sorted array."""
+        if len(self._pending) < 64:
+            for item in self._pending:
+                insort(self._keys, item)
+        else:
+            self._keys.extend(self._pending)
+            self._keys.sort()
+        self._pending.clear()
+
+    def complete(self, prefix: str, type_: str, limit: int = 25) -> List[str]:
+        """Returns up to `limit` suggested titles starting with the prefix, most popular first."""
+        if self._pending:
+            self._merge()
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return self._most_popular(type_)[:limit]
+        start = bisect_left(self._keys, (prefix,))
+        matches = set()
+        for normalized, entry_type, display in self._keys[start : start + MAX_SCAN]:
+            if not normalized.startswith(prefix):
+                break
+            if entry_type == type_:
+                matches.add(display)
+        return heapq.nlargest(
+            limit, matches, key=lambda display: self._popularity.get((type_, display), 0)
+        )
+
+    def _most_popular(self, type_: str) -> List[str]:
+        """Returns the most popular titles of a type, suggested before anything is typed."""
+        if type_ not in self._top:
+            entries = (
+                (popularity, display)
+                for (entry_type, display), popularity in self._popularity.items()
+                if entry_type == type_
+            )
+            self._top[type_] = [display for _, display in heapq.nlargest(25, entries)]
+        return self._top[type_]
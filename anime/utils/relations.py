@@ -0,0 +1,90 @@
+import logging
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+from .anilist import AniListClient
+
+log = logging.getLogger("red.historian.anime")
+
+WATCH_ORDER_RELATIONS = {"PREQUEL", "SEQUEL", "PARENT", "SIDE_STORY"}
+
+MAX_FRANCHISE_SIZE = 150
+
+FRANCHISE_TTL = 24 * 60 * 60
+
+
+def start_date_key(entry: Dict[str, Any]) -> Tuple[int, int, int, int]:
+    """Sort key putting media in release order, undated entries last."""
+    date = entry.get("startDate") or {}
+    return (date.get("year") or 9999, date.get("month") or 12, date.get("day") or 31, entry["id"])
+
+
+class RelationGraph:
+    """
+    Memoized graph of the AniList relations between anime.
+
+    Every fetched media keeps its watch order edges, and each franchise (connected component) is
+    cached for all of its members, so looking up any member again needs no request at all.
+    """
+
+    def __init__(self, client: AniListClient) -> None:
+        self.client = client
+        self._media: Dict[int, Dict[str, Any]] = {}
+        self._franchises: Dict[int, Tuple[float, Tuple[int, ...]]] = {}
+
+    def _forget(self, members: Tuple[int, ...]) -> None:
+        """Drops an expired franchise so its relations are fetched again."""
+        for id_ in members:
+            self._media.pop(id_, None)
+            self._franchises.pop(id_, None)
+
+    async def _fetch(self, ids: List[int]) -> None:
+        """Fetches a whole frontier of media in as few requests as possible."""
+        for entry in await self.client.relations(ids):
+            edges = (entry.get("relations") or {}).get("edges") or []
+            entry["related"] = [
+                edge["node"]["id"]
+                for edge in edges
+                if edge.get("relationType") in WATCH_ORDER_RELATIONS
+                and edge["node"].get("type") == "ANIME"
+            ]
+            entry.pop("relations", None)
+            self._media[entry["id"]] = entry
+        for id_ in ids:
+            # Remember media that could not be fetched so they are not requested again.
+            self._media.setdefault(id_, {"id": id_, "missing": True, "related": []})
+
+    async def watch_order(self, id_: int) -> List[Dict[str, Any]]:
+        """Returns every anime of the franchise of the given anime in release order."""
+        cached = self._franchises.get(id_)
+        if cached is not None:
+            if time.monotonic() - cached[0] < FRANCHISE_TTL:
+                return [self._media[member] for member in cached[1]]
+            self._forget(cached[1])
+
+        seen: Set[int] = set()
+        frontier = {id_}
+        # Breadth first, every level of the traversal is fetched as one batch.
+        while frontier and len(seen) < MAX_FRANCHISE_SIZE:
+            missing = [member for member in frontier if member not in self._media]
+            if missing:
+                await self._fetch(missing)
+            seen |= frontier
+            frontier = {
+                related
+                for member in frontier
+                for related in self._media[member]["related"]
+                if related not in seen
+            }
+
+        members = tuple(
+            entry["id"]
+            for entry in sorted(
+                (self._media[member] for member in seen if not self._media[member].get("missing")),
+                key=start_date_key,
+            )
+        )
+        now = time.monotonic()
+        for member in members:
+            self._franchises[member] = (now, members)
+        return [self._media[member] for member in members]
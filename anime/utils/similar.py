@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MIN_TAG_RANK = 30
+
+
+def media_features(entry: Dict[str, Any]) -> Dict[str, float]:
+    """Returns the genre and tag weights of an AniList media entry."""
+    features = {f"genre:{genre}": 1.0 for genre in entry.get("genres") or []}
+    for tag in entry.get("tags") or []:
+        if (tag.get("rank") or 0) >= MIN_TAG_RANK:
+            features[f'tag:{tag["name"]}'] = tag["rank"] / 100
+    return features
+
+
+class SimilarityIndex:
+    """
+    Normalized genre and tag vectors of the anime the cog has seen.
+
+    The vectors are the rows of a single float32 matrix that grows as anime and tags arrive, so a
+    similarity query is one matrix-vector product over every known anime.
+    """
+
+    def __init__(self, rows: int = 1024, columns: int = 128) -> None:
+        self._matrix = np.zeros((rows, columns), dtype=np.float32)
+        self._ids = np.zeros(rows, dtype=np.int32)
+        self._rows: Dict[int, int] = {}
+        self._columns: Dict[str, int] = {}
+        self._info: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id_: int) -> bool:
+        return id_ in self._rows
+
+    def _grow(self, rows: int, columns: int) -> None:
+        """Enlarges the matrix to hold at least the given number of rows and columns."""
+        height, width = self._matrix.shape
+        if rows <= height and columns <= width:
+            return
+        while height < rows:
+            height += height // 2
+        while width < columns:
+            width += 32
+        matrix = np.zeros((height, width), dtype=np.float32)
+        matrix[: self._matrix.shape[0], : self._matrix.shape[1]] = self._matrix
+        self._matrix = matrix
+        ids = np.zeros(height, dtype=np.int32)
+        ids[: len(self._ids)] = self._ids
+        self._ids = ids
+
+    def add_media(self, entry: Dict[str, Any]) -> None:
+        """Adds or updates the vector of an anime."""
+        if entry.get("id") is None or entry.get("type") != "ANIME":
+            return
+        features = media_features(entry)
+        if not features:
+            return
+        for feature in features:
+            if feature not in self._columns:
+                self._columns[feature] = len(self._columns)
+        row = self._rows.get(entry["id"])
+        if row is None:
+            row = len(self._rows)
+        self._grow(row + 1, len(self._columns))
+
+        vector = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        for feature, weight in features.items():
+            vector[self._columns[feature]] = weight
+        vector /= np.linalg.norm(vector)
+        self._matrix[row] = vector
+        self._ids[row] = entry["id"]
+        self._rows[entry["id"]] = row
+        title = entry.get("title") or {}
+        self._info[entry["id"]] = {
+            "id": entry["id"],
+            "title": {"romaji": title.get("romaji"), "english": title.get("english")},
+            "siteUrl": entry.get("siteUrl"),
+            "format": entry.get("format"),
+            "isAdult": entry.get("isAdult"),
+        }
+
+    def info(self, id_: int) -> Optional[Dict[str, Any]]:
+        """Returns the stored title and link of an anime."""
+        return self._info.get(id_)
+
+    def similar(self, id_: int, limit: int = 10) -> List[Tuple[int, float]]:
+        """Returns the `(id, cosine similarity)` pairs of the most similar anime, best first."""
+        row = self._rows.get(id_)
+        if row is None:
+            return []
+        count, width = len(self._rows), len(self._columns)
+        scores = self._matrix[:count, :width] @ self._matrix[row, :width]
+        scores[row] = -1.0
+        limit = min(limit, count - 1)
+        if limit <= 0:
+            return []
+        top = np.argpartition(scores, -limit)[-limit:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [
+            (int(self._ids[index]), float(scores[index])) for index in top if scores[index] > 0
+        ]
@@ -0,0 +1,163 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import discord
+from discord.http import Route
+
+log = logging.getLogger("red.historian.anime")
+
+
+class InteractionType:
+    ApplicationCommand = 2
+    Autocomplete = 4
+
+
+class InteractionResponseType:
+    DeferredChannelMessage = 5
+    AutocompleteResult = 8
+
+
+class OptionType:
+    String = 3
+
+
+class APIRoute(Route):
+    """Route on the API version that supports application commands and autocomplete."""
+
+    BASE = "https://discord.com/api/v10"
+
+
+def slash_command(name: str, description: str, option: str, option_description: str) -> dict:
+    """Returns the payload of a chat input command with a single autocompleted string option."""
+    return {
+        "type": 1,
+        "name": name,
+        "description": description,
+        "options": [
+            {
+                "type": OptionType.String,
+                "name": option,
+                "description": option_description,
+                "required": True,
+                "autocomplete": True,
+            }
+        ],
+    }
+
+
+async def register_commands(bot, commands_: List[dict]) -> Dict[str, str]:
+    """Creates or updates the given global commands and returns their ids by name."""
+    application_id = (await bot.application_info()).id
+    ids = {}
+    for command in commands_:
+        route = APIRoute(
+            "POST", "/applications/{application_id}/commands", application_id=application_id
+        )
+        data = await bot.http.request(route, json=command)
+        ids[data["name"]] = data["id"]
+    return ids
+
+
+async def unregister_commands(bot, ids: Dict[str, str]) -> None:
+    """Deletes the given global commands."""
+    application_id = (await bot.application_info()).id
+    for command_id in ids.values():
+        try:
+            await bot.http.request(
+                APIRoute(
+                    "DELETE",
+                    "/applications/{application_id}/commands/{command_id}",
+                    application_id=application_id,
+                    command_id=command_id,
+                )
+            )
+        except discord.NotFound:
+            pass
+
+
+class InteractionContext:
+    """The parts of a command context the finder needs, built from a raw interaction payload."""
+
+    def __init__(self, bot, payload: Dict[str, Any], channel: discord.abc.Messageable) -> None:
+        self.bot = bot
+        self.payload = payload
+        self.channel = channel
+        self.guild = bot.get_guild(int(payload["guild_id"])) if payload.get("guild_id") else None
+
+    @classmethod
+    async def from_payload(cls, bot, payload: Dict[str, Any]) -> "InteractionContext":
+        """Creates the context, fetching the channel if it is not cached."""
+        channel_id = int(payload["channel_id"])
+        channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+        return cls(bot, payload, channel)
+
+    @staticmethod
+    def options(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns the option values of an interaction by name."""
+        return {
+            option["name"]: option.get("value")
+            for option in (payload.get("data") or {}).get("options") or []
+        }
+
+    @staticmethod
+    async def allowed(bot, cog, payload: Dict[str, Any]) -> bool:
+        """Returns whether the bot answers the user of an interaction with the given cog."""
+        member = payload.get("member") or {}
+        user = member.get("user") or payload.get("user") or {}
+        guild_id = int(payload["guild_id"]) if payload.get("guild_id") else None
+        if not await bot.allowed_by_whitelist_blacklist(
+            who_id=int(user["id"]) if user.get("id") else None,
+            guild_id=guild_id,
+            role_ids=[int(role) for role in member.get("roles") or []],
+        ):
+            return False
+        guild = bot.get_guild(guild_id) if guild_id else None
+        return guild is None or not await bot.cog_disabled_in_guild(cog, guild)
+
+    @staticmethod
+    def focused(payload: Dict[str, Any]) -> Optional[str]:
+        """Returns the value of the option an autocomplete interaction is for."""
+        for option in (payload.get("data") or {}).get("options") or []:
+            if option.get("focused"):
+                return option.get("value") or ""
+        return None
+
+    @staticmethod
+    async def autocomplete(bot, payload: Dict[str, Any], choices: List[str]) -> None:
+        """Answers an autocomplete interaction."""
+        await bot.http.request(
+            APIRoute(
+                "POST",
+                "/interactions/{interaction_id}/{interaction_token}/callback",
+                interaction_id=payload["id"],
+                interaction_token=payload["token"],
+            ),
+            json={
+                "type": InteractionResponseType.AutocompleteResult,
+                "data": {"choices": [{"name": choice, "value": choice} for choice in choices]},
+            },
+        )
+
+    async def defer(self) -> None:
+        """Acknowledges the command, showing the bot as thinking until `send` is called."""
+        await self.bot.http.request(
+            APIRoute(
+                "POST",
+                "/interactions/{interaction_id}/{interaction_token}/callback",
+                interaction_id=self.payload["id"],
+                interaction_token=self.payload["token"],
+            ),
+            json={"type": InteractionResponseType.DeferredChannelMessage},
+        )
+
+    async def send(self, content: Optional[str] = None, *, embed: discord.Embed = None) -> None:
+        """Replaces the deferred response with the given content."""
+        await self.bot.http.request(
+            APIRoute(
+                "PATCH",
+                "/webhooks/{application_id}/{interaction_token}/messages/@original",
+                application_id=self.payload["application_id"],
+                interaction_token=self.payload["token"],
+            ),
+            json={"content": content, "embeds": [embed.to_dict()] if embed else []},
+        )
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .animethemes import SEARCH_INCLUDE, THEMES_FIELDS, AnimeThemesClient, index_themes
+
+log = logging.getLogger("red.historian.anime")
+
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anime (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL,
+    name TEXT NOT NULL,
+    updated_at TEXT,
+    synced_at INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS anime_slug ON anime (slug);
+CREATE INDEX IF NOT EXISTS anime_name ON anime (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS resource (
+    site TEXT NOT NULL,
+    external_id INTEGER NOT NULL,
+    anime_id INTEGER NOT NULL,
+    PRIMARY KEY (site, external_id, anime_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resource_anime ON resource (anime_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS anime_fts USING fts5 (
+    name, content='anime', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS anime_ai AFTER INSERT ON anime BEGIN
+    INSERT INTO anime_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS anime_ad AFTER DELETE ON anime BEGIN
+    INSERT INTO anime_fts (anime_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    DELETE FROM resource WHERE anime_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS anime_au AFTER UPDATE OF name ON anime BEGIN
+    INSERT INTO anime_fts (anime_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO anime_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# The theme embeds read the resources as links, the mirror also indexes them by external id.
+MIRROR_INCLUDE = (*SEARCH_INCLUDE, "resources")
+
+MIRROR_FIELDS = {
+    **THEMES_FIELDS,
+    "anime": ("id", "name", "slug", "updated_at"),
+    "resource": ("site", "external_id", "link"),
+}
+
+# Changes to the themes of an anime do not touch its `updated_at`, a weekly walk catches them.
+FULL_SYNC_INTERVAL = 7 * 24 * 60 * 60
+
+FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class AnimeThemesMirror:
+    """
+    Local SQLite copy of the AnimeThemes anime with their themes, entries and videos.
+
+    Anime are indexed by name, slug and the external ids of their resources, and stored in the
+    shape the API returns them with `MIRROR_FIELDS`, so they render like live responses.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(MIRROR_SCHEMA)
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM anime").fetchone()[0]
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def _anime(self, sql: str, parameters: Iterable[Any]) -> List[Dict[str, Any]]:
+        """Returns the stored anime selected by a query, with a `theme_slugs` index each."""
+        with self._lock:
+            rows = self._connection.execute(sql, tuple(parameters)).fetchall()
+        entries = []
+        for row in rows:
+            anime = json.loads(row["data"])
+            anime["theme_slugs"] = index_themes(anime)
+            entries.append(anime)
+        return entries
+
+    def by_slug(self, slug: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored anime with the given slug."""
+        entries = self._anime("SELECT data FROM anime WHERE slug = ?", (slug,))
+        return entries[0] if entries else None
+
+    def by_resource(self, site: str, external_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the stored anime linked to the given id on an external site."""
+        entries = self._anime(
+            "SELECT anime.data FROM resource JOIN anime ON anime.id = resource.anime_id "
+            "WHERE resource.site = ? AND resource.external_id = ? ORDER BY anime.id LIMIT 1",
+            (site, external_id),
+        )
+        return entries[0] if entries else None
+
+    def search(self, query: str, limit: int = 15) -> List[Dict[str, Any]]:
+        """Returns the anime whose name matches the query, exact names first."""
+        tokens = FTS_TOKEN.findall(query.lower())
+        if not tokens:
+            return []
+        expression = " ".join(f'"{token}"*' for token in tokens)
+        try:
+            return self._anime(
+                "SELECT anime.data FROM anime_fts JOIN anime ON anime.id = anime_fts.rowid "
+                "WHERE anime_fts MATCH ? "
+                "ORDER BY (anime.name = ? COLLATE NOCASE) DESC, bm25(anime_fts) LIMIT ?",
+                (expression, query.strip(), limit),
+            )
+        except sqlite3.OperationalError as e:
+            log.debug("Themes mirror search for %r failed: %s", query, e)
+            return []
+
+    def upsert(self, entries: Iterable[Dict[str, Any]], synced_at: int) -> int:
+        """Inserts or replaces the given AnimeThemes anime and their external ids."""
+        rows = []
+        resources = []
+        for entry in entries:
+            entry = {key: value for key, value in entry.items() if key != "theme_slugs"}
+            rows.append(
+                (
+                    entry["id"],
+                    entry.get("slug") or "",
+                    entry.get("name") or "",
+                    entry.get("updated_at"),
+                    synced_at,
+                    json.dumps(entry, separators=(",", ":")),
+                )
+            )
+            for resource in entry.get("resources") or []:
+                if resource.get("site") and resource.get("external_id") is not None:
+                    resources.append((resource["site"], resource["external_id"], entry["id"]))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO anime VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "slug = excluded.slug, name = excluded.name, updated_at = excluded.updated_at, "
+                "synced_at = excluded.synced_at, data = excluded.data",
+                rows,
+            )
+            self._connection.executemany(
+                "DELETE FROM resource WHERE anime_id = ?", [(row[0],) for row in rows]
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO resource VALUES (?, ?, ?)", resources
+            )
+        return len(rows)
+
+    def _prune(self, synced_at: int) -> int:
+        """Deletes the anime a full synchronization started at the given time did not return."""
+        with self._lock, self._connection:
+            return self._connection.execute(
+                "DELETE FROM anime WHERE synced_at < ?", (synced_at,)
+            ).rowcount
+
+    async def sync(self, client: AnimeThemesClient) -> int:
+        """
+        Synchronizes the mirror with AnimeThemes.
+
+        The first run and then one run a week walk the whole listing and drop the anime that are
+        gone, the other runs only request the anime updated since the newest stored one.
+        """
+        loop = asyncio.get_running_loop()
+        started_at = int(time.time())
+        full = started_at - int(self._get_meta("full_synced_at") or 0) >= FULL_SYNC_INTERVAL
+        with self._lock:
+            updated_since = self._connection.execute(
+                "SELECT MAX(updated_at) FROM anime"
+            ).fetchone()[0]
+        count = 0
+        pages = client.anime_pages(
+            MIRROR_INCLUDE, MIRROR_FIELDS, updated_since=None if full else updated_since
+        )
+        try:
+            async for page in pages:
+                count += await loop.run_in_executor(None, self.upsert, page, started_at)
+        finally:
+            await pages.aclose()
+        if full:
+            removed = await loop.run_in_executor(None, self._prune, started_at)
+            self._set_meta("full_synced_at", str(started_at))
+            log.info("Synchronized %s AnimeThemes anime, %s were removed.", count, removed)
+        else:
+            log.info("Synchronized %s updated AnimeThemes anime.", count)
+        return count
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import tempfile
+from typing import Any, AsyncIterator, Dict, IO, List, Optional, Tuple
+
+import aiohttp
+
+from ..utility import TRACEMOE_BASE_URL
+from .cache import TTLCache
+from .limiter import FairLimiter
+from .transport import HTTPTransport
+
+log = logging.getLogger("red.historian.anime")
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+
+# Images up to this size stay in memory, larger ones are spooled to a temporary file.
+SPOOL_SIZE = 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+RESULT_CACHE_TTL = 24 * 60 * 60
+
+
+class TraceMoeException(Exception):
+    """Base exception class for the trace.moe API wrapper."""
+
+
+class TraceMoeAPIError(TraceMoeException):
+    """Exception due to an error response from the trace.moe API."""
+
+    def __init__(self, msg: str, status: int) -> None:
+        super().__init__(f"{msg} - Status: {str(status)}")
+
+
+class TraceMoeImageTooLarge(TraceMoeException):
+    """Exception due to an image exceeding the size limit."""
+
+
+class TraceMoeClient:
+    """
+    Asynchronous wrapper client for trace.moe compatible scene search APIs.
+
+    Images are streamed from their url to the API through a spooled temporary file, and results
+    are cached by the SHA-256 of the image so reposted screenshots need no search.
+    """
+
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        base_url: str = TRACEMOE_BASE_URL,
+        max_size: int = MAX_IMAGE_SIZE,
+        limiter: Optional[FairLimiter] = None,
+        transport: Optional[HTTPTransport] = None,
+    ) -> None:
+        self.session = session
+        self.limiter = limiter or FairLimiter()
+        self.transport = transport
+        self.base_url = base_url
+        self.max_size = max_size
+        self._results = TTLCache(RESULT_CACHE_TTL, maxsize=1024)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the aiohttp session."""
+        if self.session is not None:
+            await self.session.close()
+
+    async def _session(self) -> aiohttp.ClientSession:
+        """Gets an aiohttp session by creating it if it does not already exist or the previous session is closed."""
+        if self.transport is not None:
+            return await self.transport.session()
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+        return self.session
+
+    def set_base_url(self, base_url: str) -> None:
+        """Changes the API the searches are sent to, forgetting the results of the previous one."""
+        self.base_url = base_url.rstrip("/")
+        self._results.clear()
+
+    async def _download(self, url: str) -> Tuple[IO[bytes], int, str]:
+        """Streams an image into a spooled temporary file and returns it with its size and hash."""
+        session = await self._session()
+        digest = hashlib.sha256()
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        size = 0
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    raise TraceMoeAPIError("The image could not be downloaded", response.status)
+                if (response.content_length or 0) > self.max_size:
+                    raise TraceMoeImageTooLarge(response.content_length)
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise TraceMoeImageTooLarge(size)
+                    digest.update(chunk)
+                    file.write(chunk)
+        except BaseException:
+            file.close()
+            raise
+        file.seek(0)
+        return file, size, digest.hexdigest()
+
+    @staticmethod
+    async def _chunks(file: IO[bytes]) -> AsyncIterator[bytes]:
+        """Reads a file in chunks for a streamed request body."""
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    async def search(
+        self, url: str, content_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Gets the scenes matching the image at the given url, best match first."""
+        file, size, digest = await self._download(url)
+        with file:
+            cached = self._results.get(digest)
+            if cached is not None:
+                return cached
+            session = await self._session()
+            headers = {
+                "Content-Type": content_type or "application/octet-stream",
+                "Content-Length": str(size),
+            }
+            async with self.limiter.acquire(), session.post(
+                f"{self.base_url}/search?cutBorders", data=self._chunks(file), headers=headers
+            ) as response:
+                data = await response.json(content_type=None)
+                if response.status != 200 or data.get("error"):
+                    raise TraceMoeAPIError(data.get("error") or "Search failed", response.status)
+        result = data.get("result") or []
+        self._results.set(digest, result)
+        return result
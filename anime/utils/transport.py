@@ -0,0 +1,112 @@
+import asyncio
+import importlib.util
+import logging
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import aiohttp
+
+log = logging.getLogger("red.historian.anime")
+
+# Brotli responses can only be decoded by aiohttp if a brotli package is installed.
+ACCEPT_ENCODING = (
+    "gzip, deflate, br"
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi")
+    else "gzip, deflate"
+)
+
+# Stalled connections and reads fail, long uploads like trace.moe searches are not cut short.
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_connect=10, sock_read=60)
+
+
+class HTTPTransport:
+    """
+    The HTTP transport shared by every API client of the cog.
+
+    One session with a tuned connector keeps connections alive and limits them per host, caches
+    DNS lookups and asks for compressed responses. It is created on first use inside the running
+    event loop. Every request is counted per host, which is also where timeouts are set.
+    """
+
+    def __init__(
+        self,
+        limit: int = 64,
+        limit_per_host: int = 8,
+        keepalive_timeout: float = 60.0,
+        ttl_dns_cache: int = 300,
+        timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = timeout
+        self.counters: Dict[str, Counter] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Returns the shared session, creating it if it does not exist or was closed."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Closes the shared session."""
+        if self._session is not None:
+            await self._session.close()
+
+    def _count(self, host: Optional[str], name: str, value: float = 1) -> None:
+        self.counters.setdefault(host or "unknown", Counter())[name] += value
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Returns the hooks counting the requests, errors, connections and time per host."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params
+        ) -> None:
+            context.host = params.url.host
+            context.started = asyncio.get_running_loop().time()
+            self._count(context.host, "requests")
+
+        async def on_request_end(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params
+        ) -> None:
+            elapsed = asyncio.get_running_loop().time() - context.started
+            self._count(context.host, "seconds", elapsed)
+            if params.response.status >= 400:
+                self._count(context.host, "errors")
+
+        async def on_request_exception(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params
+        ) -> None:
+            self._count(context.host, "errors")
+
+        async def on_connection_create_end(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params
+        ) -> None:
+            self._count(getattr(context, "host", None), "connections")
+
+        async def on_connection_reuseconn(
+            session: aiohttp.ClientSession, context: SimpleNamespace, params
+        ) -> None:
+            self._count(getattr(context, "host", None), "reused")
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
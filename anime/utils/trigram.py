@@ -0,0 +1,173 @@
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+NON_ALPHANUMERIC = re.compile(r"[\W_]+", re.UNICODE)
+
+MEDIA_TYPES = {"ANIME": 0, "MANGA": 1}
+
+EMPTY_POSTINGS = array("I")
+
+MAX_CANDIDATES = 256
+
+# Words a sequel or a part tells apart with, a misspelled title keeps them as they are.
+NUMBER = re.compile(r"\d+|[ivx]+")
+
+
+def normalize_title(title: str) -> str:
+    """Lowercases a title and collapses everything that is not a letter or digit into spaces."""
+    return NON_ALPHANUMERIC.sub(" ", title.lower()).strip()
+
+
+def trigrams(title: str) -> Set[str]:
+    """Returns the trigrams of a normalized title, padded so word boundaries count as well."""
+    padded = f"  {title} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def title_shape(title: str) -> int:
+    """Returns a hash of the word count and the numbers of a normalized title."""
+    words = title.split()
+    numbers = tuple(word for word in words if NUMBER.fullmatch(word))
+    return hash((len(words), numbers)) & 0xFFFFFFFF
+
+
+def media_titles(entry: Dict[str, Any]) -> List[str]:
+    """Returns every title and synonym of an AniList media entry."""
+    title = entry.get("title") or {}
+    names = [title.get("romaji"), title.get("english"), title.get("native")]
+    names.extend(entry.get("synonyms") or [])
+    return [name for name in names if name]
+
+
+class TrigramIndex:
+    """
+    Typo tolerant in-memory title index.
+
+    Every title is a slot, postings map a trigram to the slots containing it and are kept as
+    sorted integer arrays, so the index stays small even with tens of thousands of titles.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, array] = {}
+        self._owners = array("I")
+        self._types = array("b")
+        self._lengths = array("H")
+        self._shapes = array("I")
+        self._seen: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def add(self, id_: int, type_: str, titles: Iterable[str]) -> None:
+        """Adds the titles of a media entry, titles that are already indexed are skipped."""
+        media_type = MEDIA_TYPES.get(type_, -1)
+        for title in titles:
+            normalized = normalize_title(title)
+            key = hash((id_, normalized))
+            if not normalized or key in self._seen:
+                continue
+            self._seen.add(key)
+            slot = len(self._owners)
+            grams = trigrams(normalized)
+            self._owners.append(id_)
+            self._types.append(media_type)
+            self._lengths.append(min(len(grams), 0xFFFF))
+            self._shapes.append(title_shape(normalized))
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array("I")
+                postings.append(slot)
+
+    def add_media(self, entry: Dict[str, Any]) -> None:
+        """Adds an AniList media entry."""
+        if entry.get("id") is not None:
+            self.add(entry["id"], entry.get("type"), media_titles(entry))
+
+    def search(
+        self, query: str, type_: Optional[str] = None, limit: int = 5, threshold: float = 0.35
+    ) -> List[Tuple[int, float]]:
+        """
+        Returns up to `limit` `(media id, similarity)` pairs, most similar first.
+
+        The similarity is the Jaccard index of the trigram sets, the best title of a media counts.
+        """
+        best = self._similar(query, type_, threshold)
+        matches = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [(id_, similarity) for id_, (similarity, _) in matches]
+
+    def misspelling(
+        self,
+        query: str,
+        type_: Optional[str] = None,
+        similarity: float = 0.8,
+        margin: float = 0.1,
+    ) -> Optional[int]:
+        """
+        Returns the id of the media the query is a misspelled title of, if any.
+
+        The closest title has to be at least `similarity` similar, `margin` more similar than the
+        title of any other media, and have the same number of words and the same numbers, so the
+        title of a sequel that is not indexed yet is not taken for a misspelling of its prequel's.
+        """
+        best = self._similar(query, type_, max(similarity - margin, 0.0))
+        matches = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:2]
+        if not matches or matches[0][1][0] < similarity:
+            return None
+        if len(matches) > 1 and matches[0][1][0] - matches[1][1][0] < margin:
+            return None
+        id_, (_, slot) = matches[0]
+        if self._shapes[slot] != title_shape(normalize_title(query)):
+            return None
+        return id_
+
+    def _similar(
+        self, query: str, type_: Optional[str], threshold: float
+    ) -> Dict[int, Tuple[float, int]]:
+        """Returns the similarity and the slot of the most similar title of each similar media."""
+        grams = trigrams(normalize_title(query))
+        if not grams:
+            return {}
+        size = len(grams)
+        required = max(1, math.ceil(threshold * size))
+        postings = sorted(
+            (self._postings.get(gram, EMPTY_POSTINGS) for gram in grams), key=len
+        )
+
+        # Prefix filtering: a slot sharing `required` trigrams with the query has to contain one of
+        # its `size - required + 1` rarest trigrams, so only those generate candidates. The most
+        # promising candidates are then probed for the frequent trigrams with a binary search.
+        split = size - required + 1
+        counts: Counter = Counter()
+        for posting in postings[:split]:
+            counts.update(posting)
+        rest = postings[split:]
+
+        media_type = MEDIA_TYPES.get(type_, -1) if type_ is not None else None
+        best: Dict[int, Tuple[float, int]] = {}
+        for slot, shared in counts.most_common(MAX_CANDIDATES):
+            if shared + len(rest) < required:
+                break
+            if media_type is not None and self._types[slot] != media_type:
+                continue
+            for posting in rest:
+                index = bisect_left(posting, slot)
+                if index < len(posting) and posting[index] == slot:
+                    shared += 1
+            similarity = shared / (size + self._lengths[slot] - shared)
+            if similarity >= threshold:
+                owner = self._owners[slot]
+                if owner not in best or similarity > best[owner][0]:
+                    best[owner] = (similarity, slot)
+        return best
+
+    def best(
+        self, query: str, type_: Optional[str] = None, threshold: float = 0.35
+    ) -> Optional[int]:
+        """Returns the id of the most similar media, if any is similar enough."""
+        matches = self.search(query, type_, limit=1, threshold=threshold)
+        return matches[0][0] if matches else None
@@ -0,0 +1,37 @@
+"""Imports modules of the anime cog's utils without loading the cog itself and Red."""
+import ast
+import importlib
+import sys
+import types
+from pathlib import Path
+
+UTILS = Path(__file__).resolve().parent.parent / "anime" / "utils"
+
+
+def load(name: str) -> types.ModuleType:
+    """Returns the module `anime/utils/<name>.py`, its relative imports resolved in the package."""
+    if "_anime_utils" not in sys.modules:
+        package = types.ModuleType("_anime_utils")
+        package.__path__ = [str(UTILS)]
+        sys.modules["_anime_utils"] = package
+    return importlib.import_module(f"_anime_utils.{name}")
+
+
+def constant(name: str, attribute: str):
+    """
+    Returns a literal constant of `anime/utils/<name>.py` without importing the module, for the
+    modules that need Red.
+    """
+    tree = ast.parse((UTILS / f"{name}.py").read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == attribute for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise AttributeError(f"{name} has no constant {attribute}")
+
+
+def percentile(samples, fraction: float) -> float:
+    """Returns a percentile of the samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
@@ -0,0 +1,111 @@
+"""
+Parsing time of the news feeds, the streaming pull parser against the former BeautifulSoup path.
+
+Pass recorded feeds, e.g. saved with
+`curl -o ann.xml "https://www.animenewsnetwork.com/newsroom/rss.xml"` and
+`curl -o crunchyroll.xml "https://www.crunchyroll.com/newsrss?lang=enEN"`. Without them, synthetic
+feeds shaped like both, with HTML entities in the items, are used. The BeautifulSoup path needs
+`beautifulsoup4`, which the cog itself no longer requires.
+
+    python benchmarks/feed_parser.py [--ann ann.xml] [--crunchyroll crunchyroll.xml]
+"""
+import argparse
+import html
+import random
+import time
+import warnings
+from pathlib import Path
+
+from _cog import constant, load
+
+# The fields the clients parse, read from their modules as these import Red.
+ANN_FIELDS = constant("animenewsnetwork", "FEED_FIELDS")
+
+CRUNCHYROLL_FIELDS = constant("crunchyroll", "FEED_FIELDS")
+
+WORDS = "anime season trailer announced studio cast film visual caf&eacute; &nbsp;&hellip;".split()
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def synthetic_ann(rng: random.Random, count: int = 50) -> str:
+    items = "".join(
+        f"<item><title>{words(rng, 8)}</title>"
+        f"<link>https://www.animenewsnetwork.com/news/{index}</link>"
+        f'<guid isPermaLink="true">https://www.animenewsnetwork.com/news/{index}</guid>'
+        f"<description>{html.escape('<p>' + words(rng, 120) + '</p>')}</description>"
+        f"<category>Anime</category><pubDate>Mon, 19 Oct 2026 10:00:00 -0500</pubDate></item>"
+        for index in range(count)
+    )
+    channel = f'<rss version="2.0"><channel>{items}</channel></rss>'
+    return f'<?xml version="1.0" encoding="utf-8"?>{channel}'
+
+
+def synthetic_crunchyroll(rng: random.Random, count: int = 100) -> str:
+    items = "".join(
+        f"<item><title>{words(rng, 8)}</title><author>{words(rng, 2)}</author>"
+        f"<description><![CDATA[<p>{words(rng, 200)}</p>]]></description>"
+        f"<pubDate>Mon, 19 Oct 2026 10:00:00 GMT</pubDate>"
+        f"<guid>https://www.crunchyroll.com/news/{index}</guid></item>"
+        for index in range(count)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel>{items}</channel></rss>'
+
+
+def soup_items(text: str, fields, count: int):
+    from bs4 import BeautifulSoup
+
+    items = []
+    for item in BeautifulSoup(text, "html.parser").find_all("item"):
+        if len(items) >= count:
+            break
+        items.append(
+            {name: getattr(item.find(tag.lower()), "text", None) for name, tag in fields.items()}
+        )
+    return items
+
+
+def per_call(function, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ann", type=Path)
+    parser.add_argument("--crunchyroll", type=Path)
+    args = parser.parse_args()
+
+    # The former path parsed the feeds as HTML, which BeautifulSoup warns about.
+    warnings.filterwarnings("ignore", message="It looks like you're using an HTML parser")
+    feeds = load("feeds")
+    rng = random.Random(1)
+    cases = [
+        ("ann", args.ann, synthetic_ann, ANN_FIELDS),
+        ("crunchyroll", args.crunchyroll, synthetic_crunchyroll, CRUNCHYROLL_FIELDS),
+    ]
+    for name, path, synthetic, fields in cases:
+        if path is not None:
+            text, source = path.read_text(encoding="utf-8"), "recorded"
+        else:
+            text, source = synthetic(rng), "synthetic"
+        parsed = feeds.parse_items(text, fields, feeds.FEED_ITEMS)
+        print(f"{name} ({source}, {len(text) // 1024} KB, {len(parsed)} items parsed)")
+        for count in (15, feeds.FEED_ITEMS):
+            pull = per_call(lambda: feeds.parse_items(text, fields, count))
+            line = f"  {count} items: pull parser {pull * 1e3:.2f} ms"
+            try:
+                soup = per_call(lambda: soup_items(text, fields, count))
+            except ImportError:
+                line += ", BeautifulSoup not installed"
+            else:
+                line += f", BeautifulSoup {soup * 1e3:.2f} ms"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Per-message overhead of the inline mention listener.
+
+Synthetic chat messages with user mentions, custom emoji and links go through `find_mentions`,
+which is all the listener runs for a message without a mention, and through the mention regex
+alone for comparison. The CPU cost per second is reported for the given message rate.
+
+    python benchmarks/mention_prefilter.py [--messages 200000] [--rate 50] [--seed 3]
+"""
+import argparse
+import random
+import time
+
+from _cog import load
+
+WORDS = (
+    "the a to and lol ok yes no watching episode anime manga really good bad think game stream "
+    "tonight what why how"
+).split()
+
+
+def message(rng: random.Random) -> str:
+    parts = [rng.choice(WORDS) for _ in range(rng.randint(1, 30))]
+    roll = rng.random()
+    if roll < 0.1:
+        parts.append(f"<@{rng.randint(10 ** 17, 10 ** 18)}>")
+    elif roll < 0.15:
+        parts.append(f"<:pog:{rng.randint(10 ** 17, 10 ** 18)}>")
+    elif roll < 0.2:
+        parts.append("https://example.com/watch?v=abc")
+    return " ".join(parts)
+
+
+def per_message(function, messages) -> float:
+    started = time.perf_counter()
+    for content in messages:
+        function(content)
+    return (time.perf_counter() - started) / len(messages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--rate", type=float, default=50, help="messages per second")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    mentions = load("mentions")
+    rng = random.Random(args.seed)
+    messages = [message(rng) for _ in range(args.messages)]
+    with_mention = [f"{content} {{{{Frieren}}}}" for content in messages[:1000]]
+
+    prefiltered = per_message(mentions.find_mentions, messages)
+    regex = per_message(mentions.MENTION.findall, messages)
+    parsed = per_message(mentions.find_mentions, with_mention)
+    print(f"no mention, prefilter: {prefiltered * 1e9:.0f} ns/message")
+    print(f"no mention, regex only: {regex * 1e9:.0f} ns/message")
+    print(f"with a mention, parsing only: {parsed * 1e6:.1f} us/message")
+    print(f"at {args.rate:g} messages/s: {prefiltered * args.rate * 1e6:.0f} us of CPU per second")
+
+
+if __name__ == "__main__":
+    main()
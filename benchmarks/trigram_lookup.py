@@ -0,0 +1,107 @@
+"""
+Lookup latency and accuracy of the trigram title index with 50k media.
+
+The titles are synthetic, romaji-like and English-like words drawn with a Zipf distribution and
+joined by common particles, so frequent trigrams have long postings like real titles do. Every
+query is a known title with one character deleted, replaced or inserted, the share the index is
+sure enough about to skip the AniList search is reported as well.
+
+    python benchmarks/trigram_lookup.py [--media 50000] [--queries 1000] [--seed 1]
+"""
+import argparse
+import itertools
+import random
+import string
+import time
+import tracemalloc
+
+from _cog import load, percentile
+
+PARTICLES = ["no", "the", "of", "to", "wa", "ga", "season", "2", "movie", "a", "ni", "de", "in"]
+
+
+def vocabulary(rng: random.Random, size: int):
+    consonants, vowels = "kstnhmyrwgzbdpfjc", "aeiou"
+    words = set()
+    while len(words) < size:
+        if rng.random() < 0.5:
+            length = rng.randint(1, 4)
+            syllables = (rng.choice(consonants) + rng.choice(vowels) for _ in range(length))
+        else:
+            syllables = (rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+        words.add("".join(syllables))
+    return sorted(words)
+
+
+def typo(rng: random.Random, title: str) -> str:
+    characters = list(title)
+    index = rng.randrange(len(characters))
+    operation = rng.random()
+    if operation < 1 / 3:
+        del characters[index]
+    elif operation < 2 / 3:
+        characters[index] = rng.choice(string.ascii_lowercase)
+    else:
+        characters.insert(index, rng.choice(string.ascii_lowercase))
+    return "".join(characters)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--media", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    trigram = load("trigram")
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, 60000)
+    weights = list(itertools.accumulate(1 / (rank + 1) ** 0.9 for rank in range(len(words))))
+
+    def title() -> str:
+        parts = rng.choices(words, cum_weights=weights, k=rng.randint(1, 5))
+        for position in range(len(parts) - 1, 0, -1):
+            if rng.random() < 0.4:
+                parts.insert(position, rng.choice(PARTICLES))
+        return " ".join(parts)
+
+    tracemalloc.start()
+    index = trigram.TrigramIndex()
+    primary = []
+    started = time.perf_counter()
+    for id_ in range(args.media):
+        titles = [title() for _ in range(rng.choice((1, 2, 2, 3, 4)))]
+        primary.append((id_, titles[0]))
+        index.add(id_, "ANIME", titles)
+    built = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"index: {args.media} media, {len(index)} titles, built in {built:.2f} s, "
+        f"{memory / 1e6:.1f} MB"
+    )
+
+    samples = rng.sample(primary, args.queries)
+    latencies, hits, local, wrong = [], 0, 0, 0
+    for id_, name in samples:
+        query = typo(rng, name) if len(name) > 4 else name
+        started = time.perf_counter()
+        matches = index.search(query, "ANIME", limit=5)
+        latencies.append(time.perf_counter() - started)
+        hits += bool(matches) and matches[0][0] == id_
+        misspelled = index.misspelling(query, "ANIME")
+        local += misspelled == id_
+        wrong += misspelled is not None and misspelled != id_
+    print(
+        f"lookup: {args.queries} misspelled titles, top-1 {hits / args.queries:.1%}, "
+        f"p50 {percentile(latencies, 0.5) * 1e3:.2f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1e3:.2f} ms"
+    )
+    print(
+        f"answered without AniList: {local / args.queries:.1%} of the misspelled titles, "
+        f"{wrong} with another media"
+    )
+
+
+if __name__ == "__main__":
+    main()